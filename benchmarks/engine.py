@@ -0,0 +1,110 @@
+"""
+Measure the engine's own overhead against a fake wallet and fake exchanges, across grid sizes.
+
+    python benchmarks/engine.py [--latency 0.001] [--save baseline.json] [--baseline baseline.json]
+
+With `--baseline`, exits with an error when a stage got slower than the baseline by more than `--tolerance`.
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiomisc
+from aiomisc.utils import bind_socket
+from fakes import FakeExchange, FakeWalletRpcClient, FakeWalletRpcClientService
+
+from chia_liquidity_provider import Engine, Grid, LiquidityCurve, dexie_api, hashgreen_api
+from chia_liquidity_provider.services import DatabaseService
+from chia_liquidity_provider.types import Asset
+
+GRID_SIZES = (10, 100, 1000, 10000)
+FILL_FRACTION = 0.1
+
+
+async def run(rungs: int, args: argparse.Namespace, state_dir: Path) -> dict[str, float]:
+    base, quote = Asset.XCH, Asset.USDS
+    x_max = 1000 * base
+    p_min = 20 * quote / (1 * base)
+    p_max = 200 * quote / (1 * base)
+    p_init = 100 * quote / (1 * base)
+    curve = LiquidityCurve.make_out_of_range(x_max, p_min, p_max)
+    grid = Grid.make(curve, x_max // rungs, x_max)
+
+    wallet = FakeWalletRpcClient(latency=args.latency, offer_creation_time=args.offer_creation_time)
+    rpc = FakeWalletRpcClientService(wallet)
+    exchange = FakeExchange(latency=args.latency, sock=bind_socket(address="localhost", port=0))
+    db = DatabaseService(f"bench{rungs}", state_dir=state_dir)
+    dexie = dexie_api.Api("")
+    hashgreen = hashgreen_api.Api("")
+    results = {}
+    async with aiomisc.entrypoint(rpc, exchange, db, dexie, hashgreen):
+        dexie.base_url = hashgreen.base_url = exchange.url
+
+        start = time.perf_counter()
+        engine = await Engine.from_scratch(base, quote, p_init, grid, rpc, db, dexie, hashgreen)
+        results["from_scratch"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        assert await engine.check_open_trades() == []
+        results["check_open_trades"] = time.perf_counter() - start
+
+        wallet.new_block()  # otherwise there is nothing to sync
+        start = time.perf_counter()
+        assert await engine.sync_open_trades() == []
+        results["sync_open_trades"] = time.perf_counter() - start
+
+        wallet.new_block()
+        filled = wallet.fill(FILL_FRACTION)
+        start = time.perf_counter()
+        assert len(await engine.check_open_trades()) == len(filled)
+        await engine.wait_published()
+        results["flip"] = time.perf_counter() - start
+        results["flips_per_second"] = len(filled) / results["flip"] if filled else 0.0
+
+        await engine.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rungs", type=int, nargs="+", default=GRID_SIZES)
+    parser.add_argument("--latency", type=float, default=0.0, help="latency of every fake request [s]")
+    parser.add_argument("--offer-creation-time", type=float, default=0.0, help="wallet time per offer [s]")
+    parser.add_argument("--save", type=Path, help="write the results to this file")
+    parser.add_argument("--baseline", type=Path, help="compare the results to this file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    results: dict[str, dict[str, float]] = {}
+    print(f"{'rungs':>8} {'from_scratch [s]':>17} {'check [s]':>10} {'sync [s]':>9} {'flip [s]':>9} {'flips/s':>9}")
+    with tempfile.TemporaryDirectory() as state_dir:
+        for rungs in args.rungs:
+            r = results[str(rungs)] = aiomisc.run(run(rungs, args, Path(state_dir)))
+            print(
+                f"{rungs:>8} {r['from_scratch']:>17.4f} {r['check_open_trades']:>10.4f} "
+                f"{r['sync_open_trades']:>9.4f} {r['flip']:>9.4f} {r['flips_per_second']:>9.1f}"
+            )
+
+    if args.save is not None:
+        args.save.write_text(json.dumps(results, indent=2))
+
+    if args.baseline is not None:
+        regressions = []
+        for rungs, baseline in json.loads(args.baseline.read_text()).items():
+            for stage, before in baseline.items():
+                after = results.get(rungs, {}).get(stage)
+                if after is None or stage == "flips_per_second":
+                    continue  # not measured this time, or already covered by "flip"
+                if after > before * (1 + args.tolerance):
+                    regressions.append(f"{stage} at {rungs} rungs: {before:.4f}s -> {after:.4f}s")
+        for regression in regressions:
+            print("regression:", regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,517 @@
+"""
+In-process stand-ins for the chia wallet and the exchanges, to exercise the engine without a simulator.
+"""
+import asyncio
+import bisect
+import dataclasses
+import hashlib
+import itertools
+import random
+from typing import Any, Optional
+
+from aiohttp import web
+from aiomisc.service.aiohttp import AIOHTTPService
+from blspy import G2Element
+from chia.types.blockchain_format.coin import Coin
+from chia.types.blockchain_format.program import Program
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.coin_spend import CoinSpend
+from chia.types.spend_bundle import SpendBundle
+from chia.util.ints import uint32
+from chia.wallet.cat_wallet.cat_utils import (
+    CAT_MOD,
+    SpendableCAT,
+    construct_cat_puzzle,
+    unsigned_spend_bundle_for_spendable_cats,
+)
+from chia.wallet.lineage_proof import LineageProof
+from chia.wallet.payment import Payment
+from chia.wallet.puzzle_drivers import PuzzleInfo
+from chia.wallet.trading.offer import OFFER_MOD_HASH, Offer
+from chia.wallet.trading.trade_status import TradeStatus
+
+from chia_liquidity_provider.services import WalletRpcClientService
+
+FAKE_MNEMONIC = "abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon about"
+FAKE_FINGERPRINT = 3781984839
+
+# every coin of the fake wallet is locked by the puzzle that anyone can spend, so offers need no signature
+ANYONE_CAN_SPEND = Program.to(1)
+ANYONE_CAN_SPEND_HASH = ANYONE_CAN_SPEND.get_tree_hash()
+
+OPEN_STATUSES = (TradeStatus.PENDING_ACCEPT.value, TradeStatus.PENDING_CONFIRM.value, TradeStatus.PENDING_CANCEL.value)
+
+
+@dataclasses.dataclass
+class FakeCoinRecord:
+    coin: Coin
+    wallet_id: int
+    confirmed_block_index: int
+    spent_block_index: int = 0
+    # for CAT coins, the parent of the coin's parent, which makes up the lineage proof of a spend
+    lineage: Optional[bytes32] = None
+
+    @property
+    def spent(self) -> bool:
+        return self.spent_block_index > 0
+
+    @property
+    def name(self) -> bytes32:
+        return self.coin.name()
+
+
+@dataclasses.dataclass
+class FakeTrade:
+    trade_id: bytes32
+    offer: bytes
+    coins_of_interest: list[Coin]
+    created_at_time: int
+    status: int = TradeStatus.PENDING_ACCEPT.value
+    confirmed_at_index: int = 0
+    is_my_offer: bool = True
+    # the coins taking the offer gives the wallet, requested payments and change: (wallet id, amount)
+    payments: list[tuple[int, int]] = dataclasses.field(default_factory=list, repr=False)
+    # those coins, once the offer was taken: the same spend makes the same coins if it is confirmed again
+    paid: list[FakeCoinRecord] = dataclasses.field(default_factory=list, repr=False)
+
+
+@dataclasses.dataclass
+class FakeTransaction:
+    name: bytes32
+    wallet_id: int
+    confirmed_at_height: int
+    additions: list[dict] = dataclasses.field(default_factory=list, repr=False)
+    removals: list[bytes32] = dataclasses.field(default_factory=list, repr=False)
+    # the offer it cancels, if any
+    trade_id: Optional[bytes32] = None
+
+    @property
+    def confirmed(self) -> bool:
+        return self.confirmed_at_height > 0
+
+
+class FakeWalletRpcClient:
+    """
+    Mimic the parts of `WalletRpcClient` used by the engine.
+
+    Every call takes `latency` seconds. Offers are created one at a time, taking `offer_creation_time` seconds each,
+    like the wallet does under its state lock. Transactions are confirmed by the next block, which is farmed
+    right away. `new_block` takes each open offer with probability `fill_rate`.
+
+    The wallet has as much of every asset as it is asked to split. Offers are real, unsigned offers,
+    each funded by the smallest spendable coin that covers it within the requested coin amounts.
+    Taking one spends its coins and pays the wallet what it requested, in new coins.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        offer_creation_time: float = 0.0,
+        fill_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.offer_creation_time = offer_creation_time
+        self.fill_rate = fill_rate
+        self.height = 1
+        self.synced = True
+        self.trades: dict[bytes32, FakeTrade] = {}
+        self.transactions: dict[bytes32, FakeTransaction] = {}
+        self.coins: dict[bytes32, FakeCoinRecord] = {}
+        self.asset_ids: dict[int, Optional[bytes32]] = {1: None}
+        self.calls: dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._offer_lock = asyncio.Lock()
+        self._counter = 0
+        self._clock = itertools.count(1_600_000_000)
+        self._puzzle_hashes: dict[int, bytes32] = {1: ANYONE_CAN_SPEND_HASH}
+        # spendable coins of each wallet: their distinct amounts, sorted, and the coins of each amount
+        self._amounts: dict[int, list[int]] = {}
+        self._spendable: dict[int, dict[int, list[bytes32]]] = {}
+
+    def _new_id(self) -> bytes32:
+        self._counter += 1
+        return bytes32(hashlib.sha256(self._counter.to_bytes(8, "big")).digest())
+
+    async def _call(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def new_block(self) -> int:
+        self.height += 1
+        for tx in self.transactions.values():
+            if not tx.confirmed:
+                tx.confirmed_at_height = self.height
+                for name in tx.removals:
+                    self.coins[name].spent_block_index = self.height
+                for addition in tx.additions:
+                    self.mint(tx.wallet_id, addition["amount"])
+                if tx.trade_id is not None:
+                    self.trades[tx.trade_id].status = TradeStatus.CANCELLED.value
+        if self.fill_rate:
+            self.fill(self.fill_rate)
+        return self.height
+
+    def rollback(self, height: int) -> None:
+        """
+        Undo the blocks above `height`, like a reorg, before the wallet syncs the new ones.
+
+        As with the real wallet, trade records are left alone: a trade taken in a rolled back block stays confirmed.
+        """
+        for name, record in list(self.coins.items()):
+            if record.confirmed_block_index > height:
+                del self.coins[name]
+                self._unspendable(record)
+            elif record.spent_block_index > height:
+                record.spent_block_index = 0
+                self._add_spendable(record)
+        self.height = height
+
+    def open_trades(self) -> list[FakeTrade]:
+        return [t for t in self.trades.values() if t.status == TradeStatus.PENDING_ACCEPT.value]
+
+    def fill(self, fraction: float) -> list[FakeTrade]:
+        """
+        Take a random `fraction` of the open offers in the current block.
+        """
+        open_trades = self.open_trades()
+        filled = self._random.sample(open_trades, round(fraction * len(open_trades)))
+        for trade in filled:
+            self.take(trade.trade_id)
+        return filled
+
+    def take(self, trade_id: bytes32) -> FakeTrade:
+        """
+        Take an open offer in the current block.
+        """
+        trade = self.trades[trade_id]
+        trade.status = TradeStatus.CONFIRMED.value
+        trade.confirmed_at_index = self.height
+        for coin in trade.coins_of_interest:
+            record = self.coins[coin.name()]
+            record.spent_block_index = self.height
+            self._unspendable(record)  # spendable again if a reorg undid an earlier take
+        if not trade.paid:
+            trade.paid = [self.mint(wallet_id, amount) for wallet_id, amount in trade.payments]
+        else:
+            for record in trade.paid:
+                record.confirmed_block_index = self.height
+                record.spent_block_index = 0
+                self.coins[record.name] = record
+                self._add_spendable(record)
+        return trade
+
+    def mint(self, wallet_id: int, amount: int) -> FakeCoinRecord:
+        """
+        Give the wallet a new coin, confirmed in the current block.
+        """
+        puzzle_hash = self._puzzle_hash(wallet_id)
+        lineage = None
+        parent = self._new_id()
+        if self.asset_ids[wallet_id] is not None:
+            # CAT coins need a parent of the same asset, as far as the lineage proof of their spend can tell
+            lineage, parent = parent, Coin(parent, puzzle_hash, amount).name()
+        record = FakeCoinRecord(Coin(parent, puzzle_hash, amount), wallet_id, self.height, lineage=lineage)
+        self.coins[record.name] = record
+        self._add_spendable(record)
+        return record
+
+    def _puzzle_hash(self, wallet_id: int) -> bytes32:
+        puzzle_hash = self._puzzle_hashes.get(wallet_id)
+        if puzzle_hash is None:
+            puzzle = construct_cat_puzzle(CAT_MOD, self.asset_ids[wallet_id], ANYONE_CAN_SPEND)
+            puzzle_hash = self._puzzle_hashes[wallet_id] = puzzle.get_tree_hash()
+        return puzzle_hash
+
+    def _add_spendable(self, record: FakeCoinRecord) -> None:
+        amounts = self._amounts.setdefault(record.wallet_id, [])
+        coins = self._spendable.setdefault(record.wallet_id, {})
+        if record.coin.amount not in coins:
+            bisect.insort(amounts, record.coin.amount)
+        coins.setdefault(record.coin.amount, []).append(record.name)
+
+    def _unspendable(self, record: FakeCoinRecord) -> None:
+        coins = self._spendable.get(record.wallet_id, {}).get(record.coin.amount, [])
+        if record.name in coins:
+            coins.remove(record.name)
+            if not coins:
+                self._remove_amount(record.wallet_id, record.coin.amount)
+
+    def _remove_amount(self, wallet_id: int, amount: int) -> None:
+        del self._spendable[wallet_id][amount]
+        amounts = self._amounts[wallet_id]
+        del amounts[bisect.bisect_left(amounts, amount)]
+
+    def _select_coin(self, wallet_id: int, amount: int, min_coin_amount: int, max_coin_amount: int) -> FakeCoinRecord:
+        amounts = self._amounts.get(wallet_id, [])
+        i = bisect.bisect_left(amounts, max(amount, min_coin_amount))
+        if i == len(amounts) or (max_coin_amount and amounts[i] > max_coin_amount):
+            raise ValueError(f"Can't select amount higher than our spendable balance: {amount}")
+        coins = self._spendable[wallet_id][amounts[i]]
+        record = self.coins[coins.pop()]
+        if not coins:
+            self._remove_amount(wallet_id, amounts[i])
+        return record
+
+    def _unlock(self, trade: FakeTrade) -> None:
+        for coin in trade.coins_of_interest:
+            record = self.coins.get(coin.name())
+            if record is not None and not record.spent:
+                self._add_spendable(record)
+
+    def _make_offer(self, offer_dict: dict[int, int], records: dict[int, FakeCoinRecord]) -> Offer:
+        spends: list[CoinSpend] = []
+        spendable_cats: list[SpendableCAT] = []
+        for wallet_id, record in records.items():
+            amount = -offer_dict[wallet_id]
+            conditions = [[51, OFFER_MOD_HASH, amount]]
+            if record.coin.amount > amount:
+                conditions.append([51, ANYONE_CAN_SPEND_HASH, record.coin.amount - amount])
+            asset_id = self.asset_ids[wallet_id]
+            if asset_id is None:
+                spends.append(CoinSpend(record.coin, ANYONE_CAN_SPEND, Program.to(conditions)))
+            else:
+                assert record.lineage is not None
+                lineage_proof = LineageProof(record.lineage, ANYONE_CAN_SPEND_HASH, uint32(record.coin.amount))
+                spendable_cats.append(
+                    SpendableCAT(
+                        record.coin, asset_id, ANYONE_CAN_SPEND, Program.to(conditions), lineage_proof=lineage_proof
+                    )
+                )
+        bundles = [SpendBundle(spends, G2Element())]
+        if spendable_cats:
+            bundles.append(unsigned_spend_bundle_for_spendable_cats(CAT_MOD, spendable_cats))
+        requested = {
+            self.asset_ids[wallet_id]: [Payment(ANYONE_CAN_SPEND_HASH, amount, [])]
+            for wallet_id, amount in offer_dict.items()
+            if amount > 0
+        }
+        driver_dict = {
+            asset_id: PuzzleInfo({"type": "CAT", "tail": "0x" + asset_id.hex()})
+            for asset_id in map(self.asset_ids.__getitem__, offer_dict)
+            if asset_id is not None
+        }
+        coins = [record.coin for record in records.values()]
+        return Offer(Offer.notarize_payments(requested, coins), SpendBundle.aggregate(bundles), driver_dict)
+
+    # wallet rpc api
+
+    async def log_in(self, fingerprint: int) -> dict[str, Any]:
+        await self._call("log_in")
+        return {"success": fingerprint == FAKE_FINGERPRINT, "fingerprint": fingerprint}
+
+    async def get_logged_in_fingerprint(self) -> int:
+        await self._call("get_logged_in_fingerprint")
+        return FAKE_FINGERPRINT
+
+    async def get_synced(self) -> bool:
+        await self._call("get_synced")
+        return self.synced
+
+    async def get_height_info(self) -> uint32:
+        await self._call("get_height_info")
+        return uint32(self.height)
+
+    async def cat_asset_id_to_name(self, asset_id: bytes32) -> Optional[tuple[Optional[uint32], str]]:
+        await self._call("cat_asset_id_to_name")
+        for wallet_id, known in self.asset_ids.items():
+            if known == asset_id:
+                return uint32(wallet_id), "CAT"
+        wallet_id = max(self.asset_ids) + 1
+        self.asset_ids[wallet_id] = asset_id
+        return uint32(wallet_id), "CAT"
+
+    async def get_cat_asset_id(self, wallet_id: int) -> bytes32:
+        await self._call("get_cat_asset_id")
+        asset_id = self.asset_ids[int(wallet_id)]
+        assert asset_id is not None
+        return asset_id
+
+    async def get_private_key(self, fingerprint: int) -> dict[str, Any]:
+        await self._call("get_private_key")
+        return {"fingerprint": fingerprint, "seed": FAKE_MNEMONIC}
+
+    async def get_current_derivation_index(self) -> int:
+        await self._call("get_current_derivation_index")
+        return 0
+
+    def _submit(self, wallet_id: int, additions: list[dict]) -> FakeTransaction:
+        tx = FakeTransaction(self._new_id(), wallet_id, 0, additions)
+        self.transactions[tx.name] = tx
+        self.new_block()
+        return tx
+
+    async def send_transaction_multi(self, wallet_id: int, additions: list[dict], **kwargs: Any) -> FakeTransaction:
+        await self._call("send_transaction_multi")
+        return self._submit(wallet_id, additions)
+
+    async def cat_spend(self, wallet_id: int, additions: Optional[list[dict]] = None, **kwargs: Any) -> FakeTransaction:
+        await self._call("cat_spend")
+        return self._submit(wallet_id, additions or [])
+
+    async def get_transaction(self, wallet_id: int, transaction_id: bytes32) -> FakeTransaction:
+        await self._call("get_transaction")
+        return self.transactions[transaction_id]
+
+    async def create_offer_for_ids(
+        self,
+        offer_dict: dict[int, int],
+        driver_dict: Any = None,
+        solver: Any = None,
+        fee: int = 0,
+        validate_only: bool = False,
+        min_coin_amount: int = 0,
+        max_coin_amount: int = 0,
+    ) -> tuple[Offer, FakeTrade]:
+        await self._call("create_offer_for_ids")
+        offer_dict = {int(wallet_id): amount for wallet_id, amount in offer_dict.items()}
+        async with self._offer_lock:
+            if self.offer_creation_time:
+                await asyncio.sleep(self.offer_creation_time)
+            records: dict[int, FakeCoinRecord] = {}
+            try:
+                for wallet_id, amount in offer_dict.items():
+                    if amount < 0:
+                        records[wallet_id] = self._select_coin(wallet_id, -amount, min_coin_amount, max_coin_amount)
+            except ValueError:
+                for record in records.values():
+                    self._add_spendable(record)
+                raise
+            offer = self._make_offer(offer_dict, records)
+            trade = FakeTrade(
+                self._new_id(),
+                bytes(offer),
+                [record.coin for record in records.values()],
+                next(self._clock),
+                payments=[(wallet_id, amount) for wallet_id, amount in offer_dict.items() if amount > 0]
+                + [
+                    (wallet_id, record.coin.amount + offer_dict[wallet_id])
+                    for wallet_id, record in records.items()
+                    if record.coin.amount + offer_dict[wallet_id] > 0
+                ],
+            )
+            self.trades[trade.trade_id] = trade
+        return offer, trade
+
+    async def cancel_offer(self, trade_id: bytes32, fee: int = 0, secure: bool = True) -> None:
+        """
+        Cancel an offer. Its coins are spendable again right away, unless the cancellation is secure:
+        then the coins the wallet knows are spent back to it in the next block, which cancels the offer.
+        Like the real wallet, a secure cancellation skips the coins it does not know, the offer stays pending.
+        """
+        await self._call("cancel_offer")
+        trade = self.trades[trade_id]
+        if trade.status not in OPEN_STATUSES:
+            return
+        if not secure:
+            trade.status = TradeStatus.CANCELLED.value
+            self._unlock(trade)
+            return
+        trade.status = TradeStatus.PENDING_CANCEL.value
+        for coin in trade.coins_of_interest:
+            record = self.coins.get(coin.name())
+            if record is None or record.spent:
+                continue
+            self._unspendable(record)
+            tx = FakeTransaction(
+                self._new_id(),
+                record.wallet_id,
+                0,
+                [{"amount": coin.amount, "puzzle_hash": coin.puzzle_hash}],
+                [record.name],
+                trade_id,
+            )
+            self.transactions[tx.name] = tx
+
+    async def get_offer(self, trade_id: bytes32, file_contents: bool = False) -> FakeTrade:
+        await self._call("get_offer")
+        return self.trades[trade_id]
+
+    async def get_all_offers(
+        self,
+        start: int = 0,
+        end: int = 50,
+        sort_key: Optional[str] = None,
+        reverse: bool = False,
+        file_contents: bool = False,
+        exclude_my_offers: bool = False,
+        exclude_taken_offers: bool = False,
+        include_completed: bool = False,
+    ) -> list[FakeTrade]:
+        await self._call("get_all_offers")
+        trades = [t for t in self.trades.values() if include_completed or t.status in OPEN_STATUSES]
+        trades.sort(key=lambda t: t.confirmed_at_index, reverse=not reverse)
+        return trades[start:end]
+
+    async def get_coin_records_by_names(
+        self, names: list[bytes32], include_spent_coins: bool = True, **kwargs: Any
+    ) -> list[FakeCoinRecord]:
+        await self._call("get_coin_records_by_names")
+        if not self.synced:
+            raise ValueError("Wallet needs to be fully synced before finding coin information")
+        missing = [name for name in names if name not in self.coins]
+        if missing:
+            raise ValueError(f"Coin ID's: {missing} not found.")
+        records = [self.coins[name] for name in names]
+        return [record for record in records if include_spent_coins or not record.spent]
+
+    def close(self) -> None:
+        pass
+
+    async def await_closed(self) -> None:
+        pass
+
+
+class FakeWalletRpcClientService(WalletRpcClientService):
+    """
+    Wallet rpc service backed by a `FakeWalletRpcClient`
+    """
+
+    def __init__(self, client: FakeWalletRpcClient):
+        super().__init__()
+        self._client = client
+
+    async def start(self) -> None:
+        self._conn = self._client  # type: ignore
+        self._login_condition = asyncio.Condition()
+
+
+class FakeExchange(AIOHTTPService):
+    """
+    Accept offers the way dexie (`POST /offers`) and hashgreen (`POST /orders`) do.
+
+    Each post takes `latency` seconds and is rejected with probability `failure_rate`.
+    """
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.received = 0
+        self._random = random.Random(seed)
+
+    async def create_application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/offers", self.handle_dexie)
+        app.router.add_post("/orders", self.handle_hashgreen)
+        return app
+
+    async def _accept(self, offer: str) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if not offer.startswith("offer1") or self._random.random() < self.failure_rate:
+            raise web.HTTPBadRequest(reason="rejected")
+        self.received += 1
+        return web.json_response({"success": True})
+
+    async def handle_dexie(self, request: web.Request) -> web.Response:
+        return await self._accept((await request.json())["offer"])
+
+    async def handle_hashgreen(self, request: web.Request) -> web.Response:
+        return await self._accept((await request.post())["offer"])
+
+    @property
+    def url(self) -> str:
+        host, port = self.socket.getsockname()[:2]
+        return f"http://{host}:{port}"
@@ -0,0 +1,37 @@
+"""
+Compare `Grid.make` against the former per-rung curve evaluation.
+
+    python benchmarks/grid_make.py
+"""
+import timeit
+
+from chia.util.ints import uint64
+
+from chia_liquidity_provider import Grid, LiquidityCurve
+from chia_liquidity_provider.types import Asset
+
+
+def make_per_rung(curve, base_increment, base_total_amount):
+    quote_amounts = []
+    for x in range(0, base_total_amount + base_increment, base_increment):
+        quote_amounts.append(uint64(curve.f(x) - curve.f(x + base_increment)))
+    return Grid(base_amount=base_increment, quote_amounts=quote_amounts)
+
+
+def main():
+    x_max = 1000 * Asset.XCH
+    p_min = 20 * Asset.USDS / (1 * Asset.XCH)
+    p_max = 200 * Asset.USDS / (1 * Asset.XCH)
+    curve = LiquidityCurve.make_out_of_range(x_max, p_min, p_max)
+    print(f"{'rungs':>10} {'per rung [s]':>14} {'batched [s]':>14} {'speedup':>8}")
+    for rungs in (10**4, 10**5, 10**6):
+        base_increment = x_max // rungs
+        assert Grid.make(curve, base_increment, x_max) == make_per_rung(curve, base_increment, x_max)
+        number = max(1, 10**5 // rungs)
+        before = timeit.timeit(lambda: make_per_rung(curve, base_increment, x_max), number=number) / number
+        after = timeit.timeit(lambda: Grid.make(curve, base_increment, x_max), number=number) / number
+        print(f"{rungs:>10} {before:>14.4f} {after:>14.4f} {before / after:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Measure how long the `clp` command takes to start, in fresh interpreters.
+
+    python benchmarks/import_time.py [--runs 20] [--max-seconds 1.0]
+
+Also lists the slowest imports, as reported by `python -X importtime`.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = {
+    "import main": "import chia_liquidity_provider.main",
+    "clp show-init": "from chia_liquidity_provider.main import main; main(['show-init', '1000', '20', '200', '100'])",
+    "import engine": "import chia_liquidity_provider.engine",
+}
+
+
+def measure(code: str, runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def slowest_imports(code: str, count: int) -> list[tuple[int, str]]:
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], check=True, capture_output=True, text=True
+    ).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        imports.append((int(cumulative), name.rstrip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--top", type=int, default=15, help="number of slowest imports to list")
+    parser.add_argument("--max-seconds", type=float, help="fail when `clp show-init` is slower than this (median)")
+    args = parser.parse_args()
+
+    medians = {}
+    print(f"{'command':<15} {'median [s]':>11} {'min [s]':>8} {'max [s]':>8}")
+    for name, code in COMMANDS.items():
+        timings = measure(code, args.runs)
+        medians[name] = statistics.median(timings)
+        print(f"{name:<15} {medians[name]:>11.4f} {min(timings):>8.4f} {max(timings):>8.4f}")
+
+    print(f"\n{'cumulative [us]':>15}  module")
+    for cumulative, name in slowest_imports(COMMANDS["clp show-init"], args.top):
+        print(f"{cumulative:>15}  {name}")
+
+    if args.max_seconds is not None and medians["clp show-init"] > args.max_seconds:
+        print(f"regression: clp show-init took {medians['clp show-init']:.4f}s > {args.max_seconds}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Compare grid construction with the float and the fixed point liquidity curves.
+
+    python benchmarks/liquidity_curve.py
+"""
+import timeit
+
+from chia_liquidity_provider import FixedPointLiquidityCurve, Grid, LiquidityCurve
+from chia_liquidity_provider.types import Asset
+
+
+def main():
+    x_max = 1000 * Asset.XCH
+    p_min = 20 * Asset.USDS / (1 * Asset.XCH)
+    p_max = 200 * Asset.USDS / (1 * Asset.XCH)
+    float_curve = LiquidityCurve.make_out_of_range(x_max, p_min, p_max)
+    fixed_point_curve = FixedPointLiquidityCurve.make_out_of_range(x_max, p_min, p_max)
+    print(f"{'rungs':>10} {'float [s]':>12} {'fixed [s]':>12} {'ratio':>7} {'differing rungs':>16}")
+    for rungs in (10**4, 10**5, 10**6):
+        base_increment = x_max // rungs
+        float_grid = Grid.make(float_curve, base_increment, x_max)
+        fixed_point_grid = Grid.make(fixed_point_curve, base_increment, x_max)
+        differing = sum(a != b for a, b in zip(float_grid.quote_amounts, fixed_point_grid.quote_amounts))
+        number = max(1, 10**5 // rungs)
+        t_float = timeit.timeit(lambda: Grid.make(float_curve, base_increment, x_max), number=number) / number
+        t_fixed = timeit.timeit(lambda: Grid.make(fixed_point_curve, base_increment, x_max), number=number) / number
+        print(f"{rungs:>10} {t_float:>12.4f} {t_fixed:>12.4f} {t_fixed / t_float:>6.2f}x {differing:>16}")
+
+
+if __name__ == "__main__":
+    main()
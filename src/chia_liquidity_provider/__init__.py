@@ -1,3 +1,31 @@
-from . import abc
-from .engine import Engine, Grid
-from .liquidity_curve import LiquidityCurve
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from . import abc
+    from .engine import Engine
+    from .liquidity_curve import FixedPointLiquidityCurve, LiquidityCurve
+    from .types.grid import Grid
+
+# Exports are imported on first access (PEP 562), so that the offline commands do not pay for the wallet and network
+# stacks that the engine pulls in.
+_EXPORTS = {
+    "Engine": ".engine",
+    "FixedPointLiquidityCurve": ".liquidity_curve",
+    "Grid": ".types.grid",
+    "LiquidityCurve": ".liquidity_curve",
+}
+_SUBMODULES = {"abc"}
+
+__all__ = sorted([*_SUBMODULES, *_EXPORTS])
+
+
+def __getattr__(name: str) -> Any:
+    if name in _SUBMODULES:
+        value = importlib.import_module(f".{name}", __name__)
+    elif name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
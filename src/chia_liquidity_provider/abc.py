@@ -1,7 +1,13 @@
-from abc import abstractproperty
+import contextlib
+from abc import ABC, abstractmethod, abstractproperty
+from typing import Any, Iterator, Optional
 
+import aiohttp
+import aiomisc
 import aiosqlite
 
+from chia_liquidity_provider import metrics
+
 
 class DatabaseServiceBase:
     @abstractproperty
@@ -10,3 +16,47 @@ class DatabaseServiceBase:
 
     async def _start_hook(self) -> None:
         pass
+
+    def _rollback_hook(self) -> None:
+        pass
+
+
+class ExchangeApiBase(aiomisc.Service, ABC):
+    """
+    Long-lived client for an exchange api, keeping connections to it alive between requests
+    """
+
+    VENUE: str
+    _session: aiohttp.ClientSession
+
+    def __init__(self, base_url: str, limit_per_host: int = 8, timeout: float = 30, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+        self._limit_per_host = limit_per_host
+        self._timeout = timeout
+
+    async def start(self) -> None:
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=self._limit_per_host),
+            timeout=aiohttp.ClientTimeout(total=self._timeout),
+        )
+
+    async def stop(self, exception: Optional[Exception] = None) -> None:
+        await super().stop(exception)
+        await self._session.close()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self._session
+
+    @abstractmethod
+    async def post_offer(self, offer: str) -> None:
+        """
+        Post an offer, bech32 encoded.
+        """
+
+    @contextlib.contextmanager
+    def _measure_post(self) -> Iterator[None]:
+        with metrics.EXCHANGE_POST_SECONDS.time(venue=self.VENUE):
+            with metrics.EXCHANGE_POST_FAILURES.count_exceptions(venue=self.VENUE):
+                yield
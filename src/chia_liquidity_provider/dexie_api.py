@@ -1,20 +1,14 @@
-import dataclasses
+from chia_liquidity_provider.abc import ExchangeApiBase
 
-import aiohttp
-from chia.wallet.trading.offer import Offer
 
+class Api(ExchangeApiBase):
+    VENUE = "dexie"
 
-@dataclasses.dataclass
-class Api:
-    base_url: str
-
-    async def post_offer(self, offer: Offer) -> None:
-        async with (
-            aiohttp.ClientSession() as session,
-            session.post(f"{self.base_url}/offers", json={"offer": offer.to_bech32()}) as rep,
-        ):
-            if not rep.ok:
-                raise RuntimeError(rep.reason)
+    async def post_offer(self, offer: str) -> None:
+        with self._measure_post():
+            async with self.session.post(f"{self.base_url}/offers", json={"offer": offer}) as rep:
+                if not rep.ok:
+                    raise RuntimeError(rep.reason)
 
 
 mainnet = Api("https://api.dexie.space/v1")
@@ -1,23 +1,230 @@
 import asyncio
+import concurrent.futures
 import dataclasses
+import functools
 import logging
+import multiprocessing
+import time
 import typing
 
 import xdg
+from blspy import PrivateKey
 from chia.consensus.coinbase import create_puzzlehash_for_pk
-from chia.util.ints import uint32
+from chia.consensus.condition_costs import ConditionCost
+from chia.consensus.default_constants import DEFAULT_CONSTANTS
+from chia.types.blockchain_format.program import Program
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.coin_record import CoinRecord
+from chia.util.ints import uint32, uint64
 from chia.util.keychain import KeyData
 from chia.wallet.derive_keys import master_sk_to_wallet_sk
+from chia.wallet.outer_puzzles import construct_puzzle
 from chia.wallet.trade_record import TradeRecord
+from chia.wallet.trading.offer import Offer
 from chia.wallet.trading.trade_status import TradeStatus
+from chia.wallet.transaction_record import TransactionRecord
 
 if typing.TYPE_CHECKING:
     from chia_liquidity_provider import dexie_api, hashgreen_api
+    from chia_liquidity_provider.abc import ExchangeApiBase
+from chia_liquidity_provider import metrics, profiling
 from chia_liquidity_provider.services import DatabaseService, WalletRpcClientService
-from chia_liquidity_provider.types import Asset, Grid, Order, Position
+from chia_liquidity_provider.types import Asset, Fill, Grid, Order, Position, Publication, TradeSnapshot
 
 log = logging.getLogger(__name__)
 
+DEFAULT_MAX_CONCURRENT_REQUESTS = 16
+OFFERS_PAGE_SIZE = 100
+# the mempool rejects spend bundles over half the block cost limit, keep a margin for the spends themselves
+# and count each split output as a CREATE_COIN condition plus about 50 bytes of solution
+MAX_SPLIT_ADDITIONS = (DEFAULT_CONSTANTS.MAX_BLOCK_COST_CLVM // 4) // (
+    ConditionCost.CREATE_COIN.value + 50 * DEFAULT_CONSTANTS.COST_PER_BYTE
+)
+# wallet keys derived by each worker process at once
+DERIVATION_CHUNK_SIZE = 256
+# polling intervals while waiting for a block [s]
+MIN_CONFIRMATION_POLL_INTERVAL = 1
+MAX_CONFIRMATION_POLL_INTERVAL = 8
+# retry delays for offers that failed to post [s]
+MIN_PUBLICATION_RETRY_DELAY = 10
+MAX_PUBLICATION_RETRY_DELAY = 3600
+# delays before the publisher resumes after an error of its own, like a database error [s]
+MIN_PUBLISHER_ERROR_DELAY = 1
+MAX_PUBLISHER_ERROR_DELAY = 60
+# coin ids per get_coin_records_by_names request, the wallet passes them all as sqlite parameters
+COIN_RECORDS_BATCH_SIZE = 500
+# blocks by which the wallet's trade records may lag behind the height it reports
+CONFIRMATION_LAG_MARGIN = 10
+# height up to which the fills of our open orders have been handled
+OPEN_TRADES_CHECKPOINT = "open_trades"
+# blocks after which a fill is taken as final, reorgs on chia are much shallower
+REORG_DEPTH = 32
+# blocks a rolled back fill has to be confirmed again before its order is reopened
+ROLLBACK_GRACE = 6
+
+T = typing.TypeVar("T")
+
+
+async def gather_bounded(
+    limit: int, fns: typing.Iterable[typing.Callable[[], typing.Awaitable[T]]], return_exceptions: bool = False
+):
+    """
+    Like `asyncio.gather`, but with at most `limit` awaitables running at once.
+
+    Each awaitable is only made by calling its function once its turn comes, so that none is left unawaited
+    when the gathering is cancelled.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(fn: typing.Callable[[], typing.Awaitable[T]]) -> T:
+        async with semaphore:
+            return await fn()
+
+    return await asyncio.gather(*map(run, fns), return_exceptions=return_exceptions)
+
+
+def _derive_puzzle_hashes(master_sk: bytes, start: int, stop: int) -> list[bytes32]:
+    sk = PrivateKey.from_bytes(master_sk)
+    return [create_puzzlehash_for_pk(master_sk_to_wallet_sk(sk, i).get_g1()) for i in range(start, stop)]
+
+
+async def derive_puzzle_hashes(master_sk: PrivateKey, start: int, count: int) -> list[bytes32]:
+    """
+    Derive the puzzle hashes of wallet keys `start` to `start + count`, on every core if there are many of them.
+    """
+    stop = start + count
+    if count <= DERIVATION_CHUNK_SIZE:
+        return _derive_puzzle_hashes(bytes(master_sk), start, stop)
+    loop = asyncio.get_running_loop()
+    # forking would copy the state of the database and profiler threads into the workers
+    with concurrent.futures.ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as pool:
+        chunks = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    pool, _derive_puzzle_hashes, bytes(master_sk), i, min(i + DERIVATION_CHUNK_SIZE, stop)
+                )
+                for i in range(start, stop, DERIVATION_CHUNK_SIZE)
+            )
+        )
+    return [puzzle_hash for chunk in chunks for puzzle_hash in chunk]
+
+
+async def wait_synced(rpc: WalletRpcClientService) -> None:
+    while not await rpc.conn.get_synced():
+        log.info("waiting for wallet to be synced")
+        await asyncio.sleep(30)
+
+
+async def iter_confirmed_offers(
+    rpc: WalletRpcClientService, checked_height: typing.Optional[int] = None, file_contents: bool = False
+) -> typing.AsyncIterator[TradeRecord]:
+    """
+    Page through our own offers, most recently confirmed first,
+    down to those confirmed a safe margin before `checked_height`.
+
+    The wallet sorts unconfirmed trades last (their confirmation height is 0), so we can stop at the first one.
+    """
+    since = 0 if checked_height is None else max(0, checked_height - CONFIRMATION_LAG_MARGIN)
+    start = 0
+    while True:
+        page = await rpc.conn.get_all_offers(
+            start,
+            start + OFFERS_PAGE_SIZE,
+            file_contents=file_contents,
+            exclude_taken_offers=True,
+            include_completed=True,
+        )
+        for trade in page:
+            if trade.confirmed_at_index <= since:
+                return
+            if TradeStatus(trade.status) == TradeStatus.CONFIRMED:
+                yield trade
+        if len(page) < OFFERS_PAGE_SIZE:
+            return
+        start += OFFERS_PAGE_SIZE
+
+
+async def iter_pending_offers(rpc: WalletRpcClientService) -> typing.AsyncIterator[TradeRecord]:
+    """
+    Page through our own offers that have not been taken or cancelled, with their contents.
+    """
+    start = 0
+    while True:
+        page = await rpc.conn.get_all_offers(
+            start, start + OFFERS_PAGE_SIZE, file_contents=True, exclude_taken_offers=True
+        )
+        for trade in page:
+            yield trade
+        if len(page) < OFFERS_PAGE_SIZE:
+            return
+        start += OFFERS_PAGE_SIZE
+
+
+def offer_deltas(
+    offer: Offer, base_asset_id: typing.Optional[bytes32], quote_asset_id: typing.Optional[bytes32]
+) -> typing.Optional[tuple[int, int]]:
+    """
+    Return the base and quote deltas of an offer, or None if it trades anything else.
+    """
+    deltas: dict[typing.Optional[bytes32], int] = {}
+    for asset_id, amount in offer.get_offered_amounts().items():
+        deltas[asset_id] = deltas.get(asset_id, 0) - amount
+    for asset_id, amount in offer.get_requested_amounts().items():
+        deltas[asset_id] = deltas.get(asset_id, 0) + amount
+    if deltas.keys() != {base_asset_id, quote_asset_id}:
+        return None
+    return deltas[base_asset_id], deltas[quote_asset_id]
+
+
+async def match_confirmed_trades(
+    rpc: WalletRpcClientService, orders: dict[bytes32, T], checked_height: typing.Optional[int] = None
+) -> list[T]:
+    """
+    Pop the entries of `orders` whose trade has been confirmed since `checked_height`, in a few bulk requests.
+    """
+    confirmed = []
+    if not orders:
+        return confirmed
+    async for trade in iter_confirmed_offers(rpc, checked_height):
+        entry = orders.pop(trade.trade_id, None)
+        if entry is not None:
+            log.info("trade %s confirmed!", trade.trade_id)
+            confirmed.append(entry)
+            if not orders:
+                break
+    return confirmed
+
+
+def paid_coins(offer: Offer) -> set[tuple[bytes32, int]]:
+    """
+    Return the puzzle hash and amount of each coin that taking `offer` pays us.
+    """
+    coins = set()
+    for asset_id, payments in offer.requested_payments.items():
+        for payment in payments:
+            puzzle_hash = payment.puzzle_hash
+            if asset_id is not None:
+                # the payment names the inner puzzle, the coin is locked by the CAT puzzle wrapped around it
+                puzzle = construct_puzzle(offer.driver_dict[asset_id], Program.to(puzzle_hash))
+                puzzle_hash = puzzle.get_tree_hash_precalc(puzzle_hash)
+            coins.add((puzzle_hash, payment.amount))
+    return coins
+
+
+def spends_any(offer: Offer, coins: set[tuple[bytes32, int]]) -> bool:
+    """
+    Tell whether `offer` spends one of `coins`, each given by its puzzle hash and amount.
+    """
+    return any((coin.puzzle_hash, coin.amount) in coins for coin in offer.bundle.removals())
+
+
+def _encode_offers(offers: typing.Sequence[Offer]) -> list[str]:
+    return [offer.to_bech32() for offer in offers]
+
+
+async def _adopt(order: Order, offer: Offer) -> tuple[Order, Offer]:
+    return order, offer
+
 
 @dataclasses.dataclass
 class Engine:
@@ -25,6 +232,12 @@ class Engine:
     db: DatabaseService
     dexie: "dexie_api.Api"
     hashgreen: "hashgreen_api.Api"
+    max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS
+    _publisher: typing.Optional[asyncio.Task] = dataclasses.field(default=None, init=False, repr=False)
+    _publications_queued: asyncio.Event = dataclasses.field(default_factory=asyncio.Event, init=False, repr=False)
+    _publications_attempted: asyncio.Event = dataclasses.field(default_factory=asyncio.Event, init=False, repr=False)
+    # when the fill that each replacement answers was noticed, until the replacement is published
+    _requotes: dict[bytes32, float] = dataclasses.field(default_factory=dict, init=False, repr=False)
 
     @classmethod
     async def find_wallet_id(cls, rpc: WalletRpcClientService, asset: Asset) -> uint32:
@@ -49,9 +262,7 @@ class Engine:
         dexie: "dexie_api.Api",
         hashgreen: "hashgreen_api.Api",
     ) -> "Engine":
-        while not await rpc.conn.get_synced():
-            log.info("waiting for wallet to be synced")
-            await asyncio.sleep(30)
+        await wait_synced(rpc)
 
         base_asset_wallet_id = await cls.find_wallet_id(rpc, base_asset)
         quote_asset_wallet_id = await cls.find_wallet_id(rpc, quote_asset)
@@ -62,76 +273,660 @@ class Engine:
             quote_asset_wallet_id,
             grid,
         )
-        await db.init_position(position)
+        async with db.transaction():
+            await db.init_position(position)
         self = cls(rpc=rpc, db=db, dexie=dexie, hashgreen=hashgreen)
+        self.start()
+        try:
+            base_asset_amts = [-delta for delta, _ in position.grid.initial_orders(p_init) if delta < 0]
+            quote_asset_amts = [-delta for _, delta in position.grid.initial_orders(p_init) if delta < 0]
 
-        base_asset_amts = [-delta for delta, _ in position.grid.initial_orders(p_init) if delta < 0]
-        quote_asset_amts = [-delta for _, delta in position.grid.initial_orders(p_init) if delta < 0]
-
-        await self._split_coins(base_asset, base_asset_wallet_id, base_asset_amts)
-        await self._split_coins(quote_asset, quote_asset_wallet_id, quote_asset_amts)
-        await self._create_trades(p_init)
-        await self.db.conn.commit()
+            # both splits run at once, each pays to its own range of addresses
+            offset = await rpc.conn.get_current_derivation_index()
+            await asyncio.gather(
+                self._split_coins(base_asset, base_asset_wallet_id, base_asset_amts, offset),
+                self._split_coins(quote_asset, quote_asset_wallet_id, quote_asset_amts, offset + len(base_asset_amts)),
+            )
+            await self._create_trades(p_init)
+            await self.wait_published()
+        except BaseException:
+            await self.close()
+            raise
         return self
 
-    async def _split_coins(self, asset, wallet_id, amts):
-        if len(amts) < 2:
-            return  # nothing to split
+    async def _split_coins(self, asset, wallet_id, amts, offset: int):
+        """
+        Split coins of the given amounts, paid to the wallet addresses from derivation index `offset` on.
+        """
+        if not amts:
+            return  # nothing to split, a single order still needs a coin of its own
 
         position = await self.db.get_position()
         rep = await self.rpc.conn.get_private_key(position.fingerprint)
         kd = KeyData.from_mnemonic(rep["seed"])
-        wallet_sk = lambda i: master_sk_to_wallet_sk(kd.private_key, i)
 
         # split coins
-        offset = await self.rpc.conn.get_current_derivation_index()
-        additions = [
-            {
-                "amount": amt,
-                "puzzle_hash": create_puzzlehash_for_pk(wallet_sk(offset + i).get_g1()),
-            }
-            for i, amt in enumerate(amts)
-        ]
-        if asset == Asset.XCH:
-            tx = await self.rpc.conn.send_transaction_multi(wallet_id=wallet_id, additions=additions)
-        else:
-            tx = await self.rpc.conn.cat_spend(wallet_id=wallet_id, additions=additions)
-        while not tx.confirmed:
-            tx = await self.rpc.conn.get_transaction(tx.wallet_id, tx.name)
+        with profiling.stage("key_derivation"):
+            puzzle_hashes = await derive_puzzle_hashes(kd.private_key, offset, len(amts))
+        additions = [{"amount": amt, "puzzle_hash": puzzle_hash} for amt, puzzle_hash in zip(amts, puzzle_hashes)]
+        # the change of one chunk is not spendable before it is confirmed, so chunks go one block at a time
+        for start in range(0, len(additions), MAX_SPLIT_ADDITIONS):
+            chunk = additions[start : start + MAX_SPLIT_ADDITIONS]
+            if asset == Asset.XCH:
+                tx = await self.rpc.conn.send_transaction_multi(wallet_id=wallet_id, additions=chunk)
+            else:
+                tx = await self.rpc.conn.cat_spend(wallet_id=wallet_id, additions=chunk)
+            await self._wait_confirmed(tx)
 
-    async def _create_trades(self, p_init):
-        position = await self.db.get_position()
-        for o in position.grid.initial_orders(p_init):
-            await self._create_trade(*o)
+    async def _wait_confirmed(self, tx: TransactionRecord) -> None:
+        """
+        Wait for a transaction to be confirmed, only checking it again when the wallet sees a new block.
+        """
+        height = None
+        delay = MIN_CONFIRMATION_POLL_INTERVAL
+        while True:
+            new_height = await self.rpc.conn.get_height_info()
+            if new_height != height:
+                height = new_height
+                delay = MIN_CONFIRMATION_POLL_INTERVAL
+                tx = await self.rpc.conn.get_transaction(tx.wallet_id, tx.name)
+                if tx.confirmed:
+                    return
+            else:
+                delay = min(2 * delay, MAX_CONFIRMATION_POLL_INTERVAL)
+            await asyncio.sleep(delay)
 
-    async def _create_trade(self, base_delta, quote_delta):
+    async def _create_trades(self, p_init):
         position = await self.db.get_position()
-        offer, trade = await self.rpc.conn.create_offer_for_ids(
-            {position.base_asset_wallet_id: base_delta, position.quote_asset_wallet_id: quote_delta}
+        # every creation settles before a failure is raised, none is left writing after the engine is closed
+        results = await gather_bounded(
+            self.max_concurrent_requests,
+            (
+                functools.partial(self._create_and_record_trade, position, *o)
+                for o in position.grid.initial_rungs(p_init)
+            ),
+            return_exceptions=True,
         )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            raise errors[0]
+
+    async def _create_and_record_trade(self, position: Position, rung: int, base_delta) -> None:
+        await self._record_trades(position, [await self._create_trade(position, rung, base_delta)])
+
+    async def _create_trade(self, position: Position, rung: int, base_delta) -> tuple[Order, Offer]:
+        min_coin_amount, max_coin_amount = position.grid.coin_amounts(rung, base_delta)
+        base_delta, quote_delta = position.grid.order(rung, base_delta)
+        with profiling.stage("offer_creation"):
+            offer, trade = await self.rpc.conn.create_offer_for_ids(
+                {position.base_asset_wallet_id: base_delta, position.quote_asset_wallet_id: quote_delta},
+                min_coin_amount=uint64(min_coin_amount),
+                max_coin_amount=uint64(max_coin_amount),
+            )
         log.info("created trade %s", trade.trade_id)
-        await self.db.insert_order(position, Order(trade.trade_id, base_delta, quote_delta))
+        metrics.OFFERS_CREATED.inc(position=self.db.position_id)
+        return Order(trade.trade_id, base_delta, quote_delta, rung), offer
+
+    async def _record_trades(
+        self,
+        position: Position,
+        created: typing.Sequence[tuple[Order, Offer]],
+        replaced: typing.Sequence[Order] = (),
+        fills: typing.Sequence[Fill] = (),
+    ) -> None:
+        """
+        Store new orders along with their publications and forget the orders they replace, all in one transaction.
+
+        `fills` remember how the replaced orders were taken. An order that is open again has no fill,
+        unless it is one of `fills`, which are undone.
+        """
+        # encoded once for every venue, on the event loop: chia's puzzles cannot be used from another thread
+        with profiling.stage("offer_encoding"):
+            offers = _encode_offers([offer for _, offer in created])
+        async with self.db.transaction():
+            await self.db.insert_orders(position, (order for order, _ in created))
+            await self.db.insert_publications(
+                Publication(order.trade_id, venue, offer)
+                for (order, _), offer in zip(created, offers)
+                for venue in self.venues
+            )
+            await self.db.insert_trade_snapshots(
+                TradeSnapshot(
+                    order.trade_id,
+                    TradeStatus.PENDING_ACCEPT.value,
+                    tuple(coin.name() for coin in offer.get_involved_coins()),
+                )
+                for order, offer in created
+            )
+            await self.db.delete_orders(replaced)
+            await self.db.delete_publications(order.trade_id for order in replaced)
+            await self.db.delete_trade_snapshots(order.trade_id for order in replaced)
+            await self.db.delete_fills(order.trade_id for order, _ in created)
+            await self.db.insert_fills(fills)
+        for order in replaced:
+            self._requotes.pop(order.trade_id, None)
+        self._publications_queued.set()
+
+    @property
+    def venues(self) -> dict[str, "ExchangeApiBase"]:
+        return {"dexie": self.dexie, "hashgreen": self.hashgreen}
+
+    def start(self) -> None:
+        """
+        Start posting queued offers to the exchanges in the background.
+        """
+        if self._publisher is None:
+            self._publisher = asyncio.create_task(self._run_publisher())
+
+    async def close(self) -> None:
+        if self._publisher is not None:
+            self._publisher.cancel()
+            await asyncio.gather(self._publisher, return_exceptions=True)
+            self._publisher = None
+
+    async def _run_publisher(self) -> None:
+        delay = MIN_PUBLISHER_ERROR_DELAY
+        while True:
+            try:
+                await self._publish_due()
+            except Exception as err:
+                # the publications stay queued in the database, they are picked up again once this passes
+                log.error("error publishing offers, resuming in %ds: %r", delay, err)
+                await asyncio.sleep(delay)
+                delay = min(2 * delay, MAX_PUBLISHER_ERROR_DELAY)
+            else:
+                delay = MIN_PUBLISHER_ERROR_DELAY
+
+    async def _publish_due(self) -> None:
+        """
+        Post the publications that are due, or wait until some are due or queued.
+        """
+        self._publications_queued.clear()
+        due = await self.db.get_due_publications(time.time(), limit=self.max_concurrent_requests)
+        if due:
+            await gather_bounded(self.max_concurrent_requests, (functools.partial(self._post, p) for p in due))
+            self._publications_attempted.set()
+            return
+        self._publications_attempted.set()
+        next_attempt = await self.db.get_next_publication_time()
+        timeout = None if next_attempt is None else max(0.0, next_attempt - time.time())
         try:
-            await asyncio.gather(
-                self.dexie.post_offer(offer),
-                self.hashgreen.post_offer(offer),
+            await asyncio.wait_for(self._publications_queued.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _post(self, publication: Publication) -> None:
+        try:
+            with profiling.stage("exchange_post"):
+                await self.venues[publication.venue].post_offer(publication.offer)
+        except Exception as err:
+            delay = min(MIN_PUBLICATION_RETRY_DELAY * 2**publication.attempts, MAX_PUBLICATION_RETRY_DELAY)
+            log.warning(
+                "error posting trade %s to %s (attempt %d, retrying in %ds): %r",
+                publication.trade_id,
+                publication.venue,
+                publication.attempts + 1,
+                delay,
+                err,
             )
-        except:
-            log.exception("error posting trade (ignoring)")
+            async with self.db.transaction():
+                await self.db.reschedule_publication(publication, time.time() + delay)
         else:
-            log.info("trade %s successfully posted", trade.trade_id)
+            log.info("trade %s successfully posted to %s", publication.trade_id, publication.venue)
+            noticed = self._requotes.pop(publication.trade_id, None)
+            if noticed is not None:  # on the first venue only
+                metrics.REQUOTE_SECONDS.observe(time.monotonic() - noticed, position=self.db.position_id)
+            async with self.db.transaction():
+                await self.db.delete_publication(publication)
 
-    async def check_open_trades(self):
-        confirmed_trades = []
-        position = await self.db.get_position()
-        await self.rpc.conn.log_in(position.fingerprint)
-        for order in await self.db.get_order(position):
-            trade = await self.rpc.conn.get_offer(order.trade_id)
-            if TradeStatus(trade.status) == TradeStatus.CONFIRMED:
+    async def wait_published(self) -> None:
+        """
+        Wait until every queued offer has been posted at least once, successfully or not.
+        """
+        while True:
+            self._publications_attempted.clear()
+            if await self.db.count_unattempted_publications() == 0:
+                return
+            self._publications_queued.set()
+            await self._publications_attempted.wait()
+
+    async def _get_offers(self, orders: typing.Sequence[Order]) -> list[typing.Union[TradeRecord, BaseException]]:
+        """
+        Fetch the trade records of many orders at once, with at most `max_concurrent_requests` in flight.
+        Failures are returned in place of the corresponding trade record.
+        """
+        return await gather_bounded(
+            self.max_concurrent_requests,
+            (functools.partial(self.rpc.conn.get_offer, order.trade_id) for order in orders),
+            return_exceptions=True,
+        )
+
+    async def _heights(self) -> tuple[uint32, typing.Optional[int]]:
+        """
+        Return the wallet height, and the height at which our open orders were last checked, if ever.
+
+        Offers are only taken in blocks, so there is nothing to check until the former exceeds the latter.
+        """
+        height = await self.rpc.conn.get_height_info()
+        return height, await self.rewind_checked_height(height)
+
+    async def get_checked_height(self) -> typing.Optional[int]:
+        return await self.db.get_checkpoint(OPEN_TRADES_CHECKPOINT)
+
+    async def rewind_checked_height(self, height: int) -> typing.Optional[int]:
+        """
+        Return the height at which our open orders were last checked, moved back to `height` if the wallet went back.
+        """
+        checked_height = await self.get_checked_height()
+        if checked_height is not None and height < checked_height:
+            log.warning("wallet went back from height %d to %d, rechecking since then", checked_height, height)
+            await self.set_checked_height(height)
+            return height
+        return checked_height
+
+    async def set_checked_height(self, height: int) -> None:
+        async with self.db.transaction():
+            await self.db.set_checkpoint(OPEN_TRADES_CHECKPOINT, height)
+
+    async def _find_suspects(self, orders: typing.Sequence[Order]) -> list[Order]:
+        """
+        Select the orders whose trade may have changed since it was last looked up:
+        the ones that lock coins that have been spent, and the ones we know nothing about.
+        """
+        snapshots = await self.db.get_trade_snapshots()
+        coin_ids = [
+            coin_id
+            for order in orders
+            if order.trade_id in snapshots and not snapshots[order.trade_id].final
+            for coin_id in snapshots[order.trade_id].coin_ids
+        ]
+        records = await self._get_coin_records(coin_ids)
+        # a coin the wallet does not know has been spent or never was, either way the trade needs a look
+        spent = {coin_id for coin_id in coin_ids if coin_id not in records or records[coin_id].spent}
+
+        suspects = []
+        for order in orders:
+            snapshot = snapshots.get(order.trade_id)
+            if snapshot is None or not snapshot.coin_ids or snapshot.status == TradeStatus.CONFIRMED.value:
+                suspects.append(order)
+            elif not snapshot.final and any(coin_id in spent for coin_id in snapshot.coin_ids):
+                suspects.append(order)
+        return suspects
+
+    async def check_open_trades(self) -> typing.Sequence[Order]:
+        """
+        Flip the orders whose trade has been confirmed.
+
+        Nothing is checked until the wallet sees a new block, then only the trades whose coins have been spent are.
+        """
+        confirmed_trades: list[Order] = []
+        with profiling.stage("position_load"):
+            position = await self.db.get_position()
+        async with self.rpc.logged_in(position.fingerprint):
+            with profiling.stage("rpc_status"):
+                height, checked_height = await self._heights()
+            if checked_height is not None and height <= checked_height:
+                return confirmed_trades
+            if not await self.rpc.conn.get_synced():
+                return confirmed_trades  # coins look unknown to a wallet that is catching up, check again later
+            await self.check_fills(position, height)
+            with profiling.stage("position_load"):
+                orders = await self.db.get_order(position)
+            metrics.OPEN_ORDERS.set(len(orders), position=self.db.position_id)
+            with profiling.stage("rpc_status"):
+                suspects = await self._find_suspects(orders)
+                trades = await self._get_offers(suspects)
+            snapshots = []
+            complete = True
+            for order, trade in zip(suspects, trades):
+                if isinstance(trade, BaseException):
+                    log.error("could not check trade %s: %r", order.trade_id, trade)
+                    complete = False
+                    continue
+                snapshots.append(
+                    TradeSnapshot(order.trade_id, trade.status, tuple(coin.name() for coin in trade.coins_of_interest))
+                )
+                if TradeStatus(trade.status) == TradeStatus.CONFIRMED:
+                    log.info("trade %s confirmed!", order.trade_id)
+                    confirmed_trades.append(order)
+            async with self.db.transaction():
+                await self.db.insert_trade_snapshots(snapshots)
+
+            await self.flip_orders(position, confirmed_trades, height)
+            if complete:
+                await self.set_checked_height(height)
+        return confirmed_trades
+
+    async def sync_open_trades(self) -> typing.Sequence[Order]:
+        """
+        Alternative to `check_open_trades` that fetches the wallet's trades in bulk
+        and joins them against our orders by trade id.
+
+        Only the trades confirmed since the last sync are fetched.
+        """
+        with profiling.stage("position_load"):
+            position = await self.db.get_position()
+        async with self.rpc.logged_in(position.fingerprint):
+            with profiling.stage("rpc_status"):
+                height, checked_height = await self._heights()
+            if checked_height is not None and height <= checked_height:
+                return []
+            if not await self.rpc.conn.get_synced():
+                return []  # coins look unknown to a wallet that is catching up, check again later
+            await self.check_fills(position, height)
+            with profiling.stage("position_load"):
+                orders = {order.trade_id: order for order in await self.db.get_order(position)}
+            metrics.OPEN_ORDERS.set(len(orders), position=self.db.position_id)
+            with profiling.stage("rpc_status"):
+                confirmed_trades = await self.filter_spent(
+                    await match_confirmed_trades(self.rpc, orders, checked_height)
+                )
+            await self.flip_orders(position, confirmed_trades, height)
+            await self.set_checked_height(height)
+        return confirmed_trades
+
+    async def catch_up(self, excluded: typing.Collection[bytes32] = ()) -> typing.Sequence[Order]:
+        """
+        Replay the wallet's trade history since the last check in one ordered pass, after `clp manage` was down.
+
+        Besides flipping the orders that were taken, each rung is followed past the offers a run that stopped
+        in the middle of a flip created but did not record: those are recognized by their amounts and by the coin
+        they spend, which the fill before them paid us. One that was taken in turn is flipped in its place,
+        as many times as needed, and one that is still open is adopted instead of being created again,
+        which would fail or lock another coin. The trades in `excluded` belong to other positions.
+        """
+        with profiling.stage("position_load"):
+            position = await self.db.get_position()
+        async with self.rpc.logged_in(position.fingerprint):
+            # nothing can be replayed before then, and the sweeps that follow would miss what was not
+            await wait_synced(self.rpc)
+            with profiling.stage("rpc_status"):
+                height, checked_height = await self._heights()
+            if checked_height is not None and height <= checked_height:
+                return []
+            await self.check_fills(position, height)
+            with profiling.stage("position_load"):
+                orders = {order.trade_id: order for order in await self.db.get_order(position)}
+                known = await self.known_trade_ids() | set(excluded)
+            metrics.OPEN_ORDERS.set(len(orders), position=self.db.position_id)
+            with profiling.stage("rpc_status"):
+                confirmed = [trade async for trade in iter_confirmed_offers(self.rpc, checked_height, True)]
+                pending = [
+                    trade
+                    async for trade in iter_pending_offers(self.rpc)
+                    if trade.trade_id not in known and TradeStatus(trade.status) != TradeStatus.PENDING_CANCEL
+                ]
+                taken = {
+                    order.trade_id
+                    for order in await self.filter_spent(
+                        [orders[trade.trade_id] for trade in confirmed if trade.trade_id in orders]
+                    )
+                }
+                base_asset_id, quote_asset_id = await asyncio.gather(
+                    self._asset_id(position.base_asset_wallet_id), self._asset_id(position.quote_asset_wallet_id)
+                )
+            candidates = [trade for trade in confirmed if trade.trade_id not in known] + pending
+            # on the event loop: chia's puzzles cannot be used from another thread
+            with profiling.stage("offer_decoding"):
+                offers = {trade.trade_id: Offer.from_bytes(trade.offer) for trade in confirmed + pending}
+            # oldest first, so that each rung resumes with the first offer created after its last fill
+            by_deltas: dict[tuple[int, int], list[TradeRecord]] = {}
+            for trade in sorted(candidates, key=lambda c: c.created_at_time):
+                deltas = offer_deltas(offers[trade.trade_id], base_asset_id, quote_asset_id)
+                if deltas is not None:
+                    by_deltas.setdefault(deltas, []).append(trade)
+
+            # (taken order, last order of its rung, the open offer of the latter if it was left behind)
+            chains: list[tuple[Order, Order, typing.Optional[Offer]]] = []
+            for trade in reversed(confirmed):
+                if trade.trade_id not in taken:
+                    continue
+                order = last = orders[trade.trade_id]
                 log.info("trade %s confirmed!", order.trade_id)
-                confirmed_trades.append(order)
+                since = trade.created_at_time
+                offer = None
+                while offer is None:
+                    rung = last.rung
+                    if rung is None:
+                        rung = position.grid.rung(last.base_delta, last.quote_delta)
+                    deltas = position.grid.flip(last.base_delta, last.quote_delta, rung)
+                    # the flip spends a coin the fill paid us, an offer that does not was made by someone else
+                    paid = paid_coins(offers[last.trade_id])
+                    matches = by_deltas.get(deltas, [])
+                    index = next(
+                        (
+                            i
+                            for i, c in enumerate(matches)
+                            if c.created_at_time >= since and spends_any(offers[c.trade_id], paid)
+                        ),
+                        None,
+                    )
+                    if index is None:
+                        break
+                    successor = matches.pop(index)
+                    last = Order(successor.trade_id, *deltas, rung)
+                    since = successor.created_at_time
+                    if TradeStatus(successor.status) == TradeStatus.CONFIRMED:
+                        log.info("trade %s confirmed!", last.trade_id)
+                    else:
+                        log.info("adopting trade %s in place of trade %s", last.trade_id, order.trade_id)
+                        offer = offers[successor.trade_id]
+                chains.append((order, last, offer))
+
+            await self._replace_orders(
+                position,
+                [
+                    (
+                        order,
+                        functools.partial(self._flip_order, position, last)
+                        if offer is None
+                        else functools.partial(_adopt, last, offer),
+                    )
+                    for order, last, offer in chains
+                ],
+                height,
+            )
+            await self.set_checked_height(height)
+        return [order for order, _, _ in chains]
+
+    async def known_trade_ids(self) -> set[bytes32]:
+        """
+        Return the trades of the position: its open orders and its fills that a reorg could still undo.
+        """
+        orders = await self.db.get_order(await self.db.get_position())
+        return {order.trade_id for order in orders} | {fill.order.trade_id for fill in await self.db.get_fills()}
+
+    async def _asset_id(self, wallet_id: int) -> typing.Optional[bytes32]:
+        if wallet_id == 1:
+            return None
+        return await self.rpc.conn.get_cat_asset_id(wallet_id)
+
+    async def filter_spent(self, orders: typing.Sequence[Order]) -> list[Order]:
+        """
+        Keep the orders whose coins are spent, or that we know nothing about, out of those the wallet reports as taken.
+
+        The wallet does not revert its trade records when a reorg undoes a fill, the coins tell.
+        """
+        return await self._find_suspects(orders)
+
+    async def _spent_heights(self, coin_ids: typing.Sequence[bytes32]) -> dict[bytes32, int]:
+        """
+        Return the height at which each coin was spent, 0 if it is unspent or does not exist (anymore).
+        """
+        records = await self._get_coin_records(coin_ids)
+        return {coin_id: records[coin_id].spent_block_index if coin_id in records else 0 for coin_id in coin_ids}
+
+    async def _get_coin_records(self, coin_ids: typing.Sequence[bytes32]) -> dict[bytes32, CoinRecord]:
+        """
+        Look up the wallet's records of coins, in batches. The coins it does not know are left out.
+        """
+        batches = [
+            coin_ids[start : start + COIN_RECORDS_BATCH_SIZE]
+            for start in range(0, len(coin_ids), COIN_RECORDS_BATCH_SIZE)
+        ]
+        found = await gather_bounded(
+            self.max_concurrent_requests, (functools.partial(self._lookup_coin_records, batch) for batch in batches)
+        )
+        return {record.name: record for records in found for record in records}
+
+    async def _lookup_coin_records(self, coin_ids: typing.Sequence[bytes32]) -> list[CoinRecord]:
+        try:
+            return await self.rpc.conn.get_coin_records_by_names(list(coin_ids), include_spent_coins=True)
+        except ValueError:
+            # the wallet refuses the whole batch if it does not know one of the coins,
+            # like the ones created by a rolled back spend: look for them by halves
+            if len(coin_ids) == 1:
+                return []
+            middle = len(coin_ids) // 2
+            return await self._lookup_coin_records(coin_ids[:middle]) + await self._lookup_coin_records(
+                coin_ids[middle:]
+            )
+
+    async def check_fills(self, position: Position, height: int) -> list[Order]:
+        """
+        Follow the fills of the last `REORG_DEPTH` blocks through reorgs, as of wallet height `height`.
+
+        A fill whose coins are spent again, at whatever height, stands along with its replacement.
+        One that stays rolled back for `ROLLBACK_GRACE` blocks is undone: its replacement, which spends a coin
+        that the fill was to create, is cancelled and the order is reopened. Returns the reopened orders.
+        The spend can still be confirmed later, see `_withdraw_undone`.
+
+        The wallet must be synced, the coins of a wallet that is catching up look unknown.
+        """
+        async with self.db.transaction():
+            await self.db.delete_settled_fills(height - REORG_DEPTH)
+        fills = [fill for fill in await self.db.get_fills() if not fill.undone]
+        if not fills:
+            return []
+        spent_heights = await self._spent_heights([coin_id for fill in fills for coin_id in fill.coin_ids])
+        updated: list[Fill] = []
+        undone: list[Fill] = []
+        for fill in fills:
+            heights = [spent_heights[coin_id] for coin_id in fill.coin_ids]
+            if all(heights):
+                if fill.rolled_back_height is not None:
+                    log.info("fill of trade %s confirmed again at height %d", fill.order.trade_id, max(heights))
+                if fill.rolled_back_height is not None or fill.height != max(heights):
+                    updated.append(dataclasses.replace(fill, height=max(heights), rolled_back_height=None))
+            elif fill.rolled_back_height is None:
+                log.warning("fill of trade %s was rolled back by a reorg", fill.order.trade_id)
+                updated.append(dataclasses.replace(fill, rolled_back_height=height))
+            elif height - fill.rolled_back_height >= ROLLBACK_GRACE:
+                undone.append(fill)
+        async with self.db.transaction():
+            await self.db.insert_fills(updated)
+        return await self._undo_fills(position, undone)
+
+    async def _undo_fills(self, position: Position, fills: typing.Sequence[Fill]) -> list[Order]:
+        """
+        Reopen the orders of `fills`, most recent first, in place of their replacement.
+
+        The replacements were posted already, so they are cancelled securely. The coin each spends is gone with the
+        rolled back spend, until that spend is confirmed after all: the fills are kept, as undone, until then.
+        """
+        if not fills:
+            return []
+        open_orders = {order.trade_id: order for order in await self.db.get_order(position)}
+        reopened: list[tuple[Order, Offer]] = []
+        replaced: list[Order] = []
+        undone: list[Fill] = []
+        abandoned: list[bytes32] = []
+        for fill in fills:
+            replacement = open_orders.pop(fill.replacement_id, None)
+            if replacement is None:
+                log.error(
+                    "cannot undo the fill of trade %s, its replacement %s is not open anymore",
+                    fill.order.trade_id,
+                    fill.replacement_id,
+                )
+                abandoned.append(fill.order.trade_id)
+                continue
+            log.warning("undoing the fill of trade %s, cancelling trade %s", fill.order.trade_id, fill.replacement_id)
+            await self.rpc.conn.cancel_offer(fill.replacement_id, secure=True)
+            trade = await self.rpc.conn.get_offer(fill.order.trade_id, file_contents=True)
+            reopened.append((fill.order, Offer.from_bytes(trade.offer)))
+            replaced.append(replacement)
+            undone.append(dataclasses.replace(fill, undone=True))
+            open_orders[fill.order.trade_id] = fill.order
+        await self._record_trades(position, reopened, replaced, undone)
+        async with self.db.transaction():
+            await self.db.delete_fills(abandoned)
+        return [order for order, _ in reopened]
+
+    async def flip_orders(self, position: Position, orders: typing.Sequence[Order], height: int) -> None:
+        """
+        Replace filled orders with their opposite, with at most `max_concurrent_requests` offers being created at once.
+
+        The replacements are recorded together in one transaction, including when some of them could not be created,
+        along with the fills, as of wallet height `height`.
+        """
+        await self._replace_orders(
+            position, [(order, functools.partial(self._flip_order, position, order)) for order in orders], height
+        )
+
+    async def _replace_orders(
+        self,
+        position: Position,
+        replacements: typing.Sequence[tuple[Order, typing.Callable[[], typing.Awaitable[tuple[Order, Offer]]]]],
+        height: int,
+    ) -> None:
+        """
+        Replace each filled order with the order and offer its function yields, see `flip_orders`.
+        """
+        start = time.monotonic()
+        metrics.FILLS.inc(len(replacements), position=self.db.position_id)
+        await self._withdraw_undone([order for order, _ in replacements])
+        results = await gather_bounded(
+            self.max_concurrent_requests,
+            (replacement for _, replacement in replacements),
+            return_exceptions=True,
+        )
+        created: list[tuple[Order, Offer]] = []
+        replaced: list[Order] = []
+        errors: list[BaseException] = []
+        for (order, _), result in zip(replacements, results):
+            if isinstance(result, BaseException):
+                log.error("could not flip order %s: %r", order.trade_id, result)
+                errors.append(result)
+            else:
+                created.append(result)
+                replaced.append(order)
+        snapshots = await self.db.get_trade_snapshots()
+        fills = [
+            Fill(order, new_order.trade_id, snapshots[order.trade_id].coin_ids, height)
+            for order, (new_order, _) in zip(replaced, created)
+            if order.trade_id in snapshots and snapshots[order.trade_id].coin_ids
+        ]
+        self._requotes.update((order.trade_id, start) for order, _ in created)
+        await self._record_trades(position, created, replaced, fills)
+        metrics.FLIP_FAILURES.inc(len(errors), position=self.db.position_id)
+        if errors:
+            raise errors[0]
+
+    async def _withdraw_undone(self, orders: typing.Sequence[Order]) -> None:
+        """
+        Cancel the replacements of the undone fills of `orders`, which are taken again.
+
+        If an order is taken by the spend that was rolled back, that spend brings back the coin the replacement
+        of its undone fill spends, and the replacement can be taken again from the exchanges: it is cancelled
+        securely now that the wallet knows that coin, before the order is replaced again.
+        """
+        trade_ids = {order.trade_id for order in orders}
+        undone = [fill for fill in await self.db.get_fills() if fill.undone and fill.order.trade_id in trade_ids]
+        for fill in undone:
+            log.warning(
+                "trade %s was taken after its fill was undone, cancelling trade %s",
+                fill.order.trade_id,
+                fill.replacement_id,
+            )
+            await self.rpc.conn.cancel_offer(fill.replacement_id, secure=True)
+        async with self.db.transaction():
+            await self.db.delete_fills(fill.order.trade_id for fill in undone)
 
-        for order in confirmed_trades:
-            await self._create_trade(*position.grid.flip(order.base_delta, order.quote_delta))
-            await self.db.delete_order(order)
-        await self.db.conn.commit()
+    async def _flip_order(self, position: Position, order: Order) -> tuple[Order, Offer]:
+        rung = order.rung
+        if rung is None:
+            rung = position.grid.rung(order.base_delta, order.quote_delta)
+        # This cannot be prepared ahead of the fill: the replacement spends the coin the taker pays us,
+        # which only exists once their spend is confirmed, and every other coin is locked by an open offer.
+        return await self._create_trade(position, rung, -order.base_delta)
@@ -1,5 +1,7 @@
 import dataclasses
 import math
+from fractions import Fraction
+from typing import ClassVar, Iterable, Sequence
 
 
 @dataclasses.dataclass(frozen=True)
@@ -14,6 +16,30 @@ class LiquidityCurve:
         L = self.L
         return L**2 / (x + L / math.sqrt(self.p_max)) - L * math.sqrt(self.p_min)
 
+    def f_batch(self, xs: Iterable) -> list[float]:
+        """
+        Evaluate `f` at many points at once, with the same rounding as `f`.
+        """
+        L = self.L
+        L2 = L**2
+        a = L / math.sqrt(self.p_max)
+        b = L * math.sqrt(self.p_min)
+        return [L2 / (x + a) - b for x in xs]
+
+    def deltas(self, xs: Sequence) -> list[float]:
+        """
+        Return f(xs[i]) - f(xs[i + 1]) for each pair of consecutive points.
+        """
+        ys = self.f_batch(xs)
+        return [y0 - y1 for y0, y1 in zip(ys, ys[1:])]
+
+    def quote_deltas(self, xs: Sequence) -> tuple[list[float], list[float]]:
+        """
+        Return the deltas that the LP pays and receives between consecutive points, left for the grid to round.
+        """
+        deltas = self.deltas(xs)
+        return deltas, deltas
+
     @classmethod
     def make_out_of_range(cls, x_max, p_min, p_max):
         L = math.sqrt(p_max) / (math.sqrt(p_max / p_min) - 1) * x_max
@@ -22,3 +48,64 @@ class LiquidityCurve:
     @classmethod
     def make(cls, x, y, p_min):
         "TODO: wrap my head around the equations"
+
+
+@dataclasses.dataclass(frozen=True)
+class FixedPointLiquidityCurve:
+    """
+    Integer counterpart of `LiquidityCurve`, free of float rounding errors.
+
+    Square roots of prices are fixed point numbers with `PRECISION` fractional bits and L is an exact fraction.
+    Amounts are rounded to whole mojos in favour of the LP: down for the quote it pays for base,
+    up for the quote it asks for base, so neither leg of a rung strays from the curve at its expense.
+    """
+
+    PRECISION: ClassVar[int] = 128
+    sqrt_p_min: int
+    sqrt_p_max: int
+    L: Fraction
+
+    @classmethod
+    def _sqrt(cls, p) -> int:
+        p = Fraction(p)
+        return math.isqrt((p.numerator << 2 * cls.PRECISION) // p.denominator)
+
+    def _scaled_f_batch(self, xs: Iterable[int]) -> list[int]:
+        # f(x) = L**2 / (x + L / sqrt(p_b)) - L * sqrt(p_a), over a common denominator,
+        # scaled by 2**PRECISION and rounded down
+        n, d = self.L.numerator, self.L.denominator
+        A, B = self.sqrt_p_min, self.sqrt_p_max
+        S = 1 << self.PRECISION
+        c1 = n * n * S * (B - A) << self.PRECISION
+        c2 = n * d * A * B << self.PRECISION
+        c3 = d * d * S * B
+        c4 = d * n * S * S
+        return [(c1 - x * c2) // (x * c3 + c4) for x in xs]
+
+    def f(self, x: int) -> int:
+        return self._scaled_f_batch([x])[0] >> self.PRECISION
+
+    def f_batch(self, xs: Iterable[int]) -> list[int]:
+        return [y >> self.PRECISION for y in self._scaled_f_batch(xs)]
+
+    def deltas(self, xs: Sequence[int]) -> list[int]:
+        """
+        Return f(xs[i]) - f(xs[i + 1]) for each pair of consecutive points, rounded down.
+        """
+        return self.quote_deltas(xs)[0]
+
+    def quote_deltas(self, xs: Sequence[int]) -> tuple[list[int], list[int]]:
+        """
+        Return f(xs[i]) - f(xs[i + 1]) for each pair of consecutive points, rounded down and rounded up.
+        """
+        ys = self._scaled_f_batch(xs)
+        # the scaled values are rounded down, so each difference is off by less than one either way
+        scaled = [y0 - y1 for y0, y1 in zip(ys, ys[1:])]
+        return [(d - 1) >> self.PRECISION for d in scaled], [-((-d - 1) >> self.PRECISION) for d in scaled]
+
+    @classmethod
+    def make_out_of_range(cls, x_max, p_min, p_max):
+        A = cls._sqrt(p_min)
+        B = cls._sqrt(p_max)
+        L = Fraction(int(x_max) * A * B, (B - A) << cls.PRECISION)
+        return cls(A, B, L)
@@ -1,23 +1,39 @@
 import asyncio
 import logging
 from decimal import Decimal
-from unittest.mock import Mock
+from fractions import Fraction
+from typing import TYPE_CHECKING, Optional
 
-import aiomisc
 import click
-from chia.types.blockchain_format.sized_bytes import bytes32
-from chia.wallet.trade_record import TradeRecord
 
-from chia_liquidity_provider import Engine, Grid, LiquidityCurve, dexie_api, hashgreen_api
-from chia_liquidity_provider.services import DatabaseService, WalletRpcClientService
+import chia_liquidity_provider.profiling as profiling
+from chia_liquidity_provider import FixedPointLiquidityCurve, Grid, LiquidityCurve
 from chia_liquidity_provider.types import Asset
 
+if TYPE_CHECKING:
+    import aiomisc
+
+    from chia_liquidity_provider.services import WalletRpcClientService
+
+# The commands that talk to the wallet import the engine and its dependencies themselves,
+# the offline ones should start quickly.
+
 log = logging.getLogger("chia_liquidity_provider")
 
+# bounds of the adaptive polling interval [s]
+MIN_POLL_INTERVAL = 5
+MAX_POLL_INTERVAL = 30
 
-db = DatabaseService()
-rpc = WalletRpcClientService()
-services = [db, rpc]
+
+def make_services() -> "tuple[WalletRpcClientService, list[aiomisc.Service]]":
+    """
+    Create the wallet rpc client and the list of services shared by the online commands.
+    """
+    from chia_liquidity_provider import dexie_api, hashgreen_api
+    from chia_liquidity_provider.services import WalletRpcClientService
+
+    rpc = WalletRpcClientService()
+    return rpc, [rpc, dexie_api.mainnet, hashgreen_api.mainnet]
 
 
 @click.group()
@@ -25,12 +41,47 @@ def main():
     pass
 
 
+exact_option = click.option(
+    "--exact",
+    help="Compute the grid with integer arithmetic instead of floats",
+    is_flag=True,
+)
+
+profile_option = click.option(
+    "--profile",
+    help="Time each stage and write profiles to the state directory",
+    is_flag=True,
+)
+
+
+def make_profiler(name: str, profile: bool) -> Optional[profiling.Profiler]:
+    if not profile:
+        return None
+    from chia_liquidity_provider.services.database import DEFAULT_STATE_DIRECTORY
+
+    return profiling.Profiler(DEFAULT_STATE_DIRECTORY / "profiles", name)
+
+
+def to_mojo_price(price: Decimal, base: Asset, quote: Asset) -> Fraction:
+    """
+    Convert a price in quote per base to quote mojos per base mojo, exactly, so that `--exact` grids start from it.
+    """
+    return Fraction(price) * quote.mojos_per_unit / base.mojos_per_unit
+
+
+def default_max_concurrent_requests() -> int:
+    from chia_liquidity_provider.engine import DEFAULT_MAX_CONCURRENT_REQUESTS
+
+    return DEFAULT_MAX_CONCURRENT_REQUESTS
+
+
 @main.command()
 @click.argument("x_max", type=Decimal)
 @click.argument("p_min", type=Decimal)
 @click.argument("p_max", type=Decimal)
 @click.argument("p_init", type=Decimal, default=0)
-def show_init(x_max, p_min, p_max, p_init) -> None:
+@exact_option
+def show_init(x_max, p_min, p_max, p_init, exact: bool) -> None:
     """
     x_max: Total liquidity depth [XCH]"
     p_min: Minimum price [USD/XCH]
@@ -40,10 +91,10 @@ def show_init(x_max, p_min, p_max, p_init) -> None:
     quote = Asset.USDS
     x_max = x_max * base
     Δx = ".1" * base
-    p_min = p_min * quote / (1 * base)
-    p_max = p_max * quote / (1 * base)
-    p_init = p_init * quote / (1 * base)
-    curve = LiquidityCurve.make_out_of_range(x_max, p_min, p_max)
+    p_min = to_mojo_price(p_min, base, quote)
+    p_max = to_mojo_price(p_max, base, quote)
+    p_init = to_mojo_price(p_init, base, quote)
+    curve = (FixedPointLiquidityCurve if exact else LiquidityCurve).make_out_of_range(x_max, p_min, p_max)
 
     p = Grid.make(curve, Δx, x_max)
 
@@ -65,24 +116,40 @@ def show_init(x_max, p_min, p_max, p_init) -> None:
     help="Set the fingerprint to specify which wallet to use",
     type=int,
 )
+@click.option(
+    "-p",
+    "--position",
+    help="Name of the position to create",
+    default="default",
+    show_default=True,
+)
 @click.argument("x_max", type=Decimal)
 @click.argument("p_min", type=Decimal)
 @click.argument("p_max", type=Decimal)
 @click.argument("p_init", type=Decimal, default=0)
-def init(fingerprint: int, x_max, p_min, p_max, p_init) -> None:
+@exact_option
+@profile_option
+def init(fingerprint: int, position: str, x_max, p_min, p_max, p_init, exact: bool, profile: bool) -> None:
     """
     x_max: Total liquidity depth [XCH]"
     p_min: Minimum price [USD/XCH]
     p_max: Maximum price [USD/XCH]
     """
+    import aiomisc
+
+    from chia_liquidity_provider import Engine, dexie_api, hashgreen_api
+    from chia_liquidity_provider.services import DatabaseService
+
     base = Asset.XCH
     quote = Asset.USDS
     x_max = x_max * base
     Δx = ".1" * base
-    p_min = p_min * quote / (1 * base)
-    p_max = p_max * quote / (1 * base)
-    p_init = p_init * quote / (1 * base)
-    curve = LiquidityCurve.make_out_of_range(x_max, p_min, p_max)
+    p_min = to_mojo_price(p_min, base, quote)
+    p_max = to_mojo_price(p_max, base, quote)
+    p_init = to_mojo_price(p_init, base, quote)
+    curve = (FixedPointLiquidityCurve if exact else LiquidityCurve).make_out_of_range(x_max, p_min, p_max)
+    rpc, services = make_services()
+    db = DatabaseService(position)
 
     async def amain() -> None:
         tm = await Engine.from_scratch(
@@ -95,19 +162,98 @@ def init(fingerprint: int, x_max, p_min, p_max, p_init) -> None:
             dexie_api.mainnet,
             hashgreen_api.mainnet,
         )
+        await tm.close()
 
-    aiomisc.run(amain(), *services)
+    with profiling.enabled(make_profiler("init", profile)):
+        aiomisc.run(amain(), db, *services)
 
 
 @main.command()
-def manage() -> None:
+@click.option(
+    "-p",
+    "--position",
+    "positions",
+    help="Name of a position to manage, may be repeated",
+    multiple=True,
+    default=["default"],
+    show_default=True,
+)
+@click.option(
+    "-j",
+    "--max-concurrent-requests",
+    help="Maximum number of wallet rpc requests in flight while checking trades",
+    type=click.IntRange(min=1),
+    default=default_max_concurrent_requests,
+)
+@click.option(
+    "--bulk-sync",
+    help="Fetch the wallet's trades in pages instead of one request per open order",
+    is_flag=True,
+)
+@click.option(
+    "--watch",
+    help="React to wallet notifications from the chia daemon instead of only polling",
+    is_flag=True,
+)
+@click.option(
+    "--metrics-port",
+    help="Serve Prometheus metrics on this local port",
+    type=click.IntRange(min=1, max=65535),
+)
+@profile_option
+def manage(
+    positions: tuple[str, ...],
+    max_concurrent_requests: int,
+    bulk_sync: bool,
+    watch: bool,
+    metrics_port: Optional[int],
+    profile: bool,
+) -> None:
+    import aiomisc
+
+    from chia_liquidity_provider import Engine, dexie_api, hashgreen_api
+    from chia_liquidity_provider.manager import Manager
+    from chia_liquidity_provider.services import DatabaseService, MetricsService, WalletEventsService
+
+    rpc, services = make_services()
+    dbs = [DatabaseService(position) for position in positions]
+    events = WalletEventsService()
+    extra_services: list[aiomisc.Service] = []
+    if watch:
+        extra_services.append(events)
+    if metrics_port is not None:
+        extra_services.append(MetricsService(port=metrics_port))
+    profiler = make_profiler("manage", profile)
+
     async def amain() -> None:
-        tm = Engine(rpc, db, dexie_api.mainnet, hashgreen_api.mainnet)
+        tm = Manager(
+            rpc,
+            [Engine(rpc, db, dexie_api.mainnet, hashgreen_api.mainnet, max_concurrent_requests) for db in dbs],
+        )
+        tm.start()
+        # follow each rung through everything that happened while we were down before the regular sweeps
+        await tm.catch_up()
+        interval = MIN_POLL_INTERVAL
         while True:
             try:
-                await tm.check_open_trades()
+                if bulk_sync:
+                    confirmed_trades = await tm.sync_open_trades()
+                else:
+                    confirmed_trades = await tm.check_open_trades()
             except Exception as err:
                 log.error("could not check open trades %s", err)
-            await asyncio.sleep(30)
+                confirmed_trades = []
+            if profiler is not None:
+                log.info("sweep stages:\n%s", profiler.lap().format())
+            # poll eagerly while the market is moving, back off while it is quiet
+            if confirmed_trades:
+                interval = MIN_POLL_INTERVAL
+            else:
+                interval = min(2 * interval, MAX_POLL_INTERVAL)
+            if watch:
+                await events.wait_for_change(interval)
+            else:
+                await asyncio.sleep(interval)
 
-    aiomisc.run(amain(), *services)
+    with profiling.enabled(profiler):
+        aiomisc.run(amain(), *dbs, *services, *extra_services)
@@ -0,0 +1,139 @@
+import asyncio
+import dataclasses
+import logging
+import typing
+from collections import defaultdict
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+
+from chia_liquidity_provider import metrics
+from chia_liquidity_provider.engine import Engine, match_confirmed_trades
+from chia_liquidity_provider.services import WalletRpcClientService
+from chia_liquidity_provider.types import Order
+
+log = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class Manager:
+    """
+    Drive several positions from one process.
+
+    The engines share the wallet rpc connection and the exchange clients, each one has its own database.
+    """
+
+    rpc: WalletRpcClientService
+    engines: typing.Sequence[Engine]
+
+    def start(self) -> None:
+        for engine in self.engines:
+            engine.start()
+
+    async def close(self) -> None:
+        await asyncio.gather(*(engine.close() for engine in self.engines))
+
+    async def _by_fingerprint(self) -> dict[int, list[Engine]]:
+        groups: dict[int, list[Engine]] = defaultdict(list)
+        for engine in self.engines:
+            position = await engine.db.get_position()
+            groups[position.fingerprint].append(engine)
+        return groups
+
+    async def check_open_trades(self) -> typing.Sequence[Order]:
+        """
+        Check every position concurrently, each one looking up its open orders on its own.
+
+        The rpc service takes care of switching between the wallets of the positions.
+        """
+        confirmed_trades: list[Order] = []
+        with metrics.SWEEP_SECONDS.time():
+            results = await asyncio.gather(
+                *(engine.check_open_trades() for engine in self.engines),
+                return_exceptions=True,
+            )
+        for engine, result in zip(self.engines, results):
+            if isinstance(result, BaseException):
+                log.error("could not check open trades of position %s: %r", engine.db.position_id, result)
+            else:
+                confirmed_trades.extend(result)
+        return confirmed_trades
+
+    async def catch_up(self) -> typing.Sequence[Order]:
+        """
+        Replay what happened to every position while we were down, see `Engine.catch_up`.
+
+        Positions can share a wallet, none of them takes over the trades of another.
+        """
+        confirmed_trades: list[Order] = []
+        with metrics.SWEEP_SECONDS.time():
+            known = await asyncio.gather(*(engine.known_trade_ids() for engine in self.engines))
+            results = await asyncio.gather(
+                *(
+                    engine.catch_up(excluded=set().union(*known[:i], *known[i + 1 :]))
+                    for i, engine in enumerate(self.engines)
+                ),
+                return_exceptions=True,
+            )
+        for engine, result in zip(self.engines, results):
+            if isinstance(result, BaseException):
+                log.error("could not catch up on position %s: %r", engine.db.position_id, result)
+            else:
+                confirmed_trades.extend(result)
+        return confirmed_trades
+
+    async def sync_open_trades(self) -> typing.Sequence[Order]:
+        """
+        Check every position, paging through the trades of each wallet once for all of its positions.
+        """
+        with metrics.SWEEP_SECONDS.time():
+            return await self._sync_open_trades()
+
+    async def _sync_open_trades(self) -> typing.Sequence[Order]:
+        confirmed_trades: list[Order] = []
+        for fingerprint, group in (await self._by_fingerprint()).items():
+            async with self.rpc.logged_in(fingerprint):
+                height = await self.rpc.conn.get_height_info()
+                engines: list[Engine] = []
+                checked_heights: list[typing.Optional[int]] = []
+                for engine in group:
+                    checked_height = await engine.rewind_checked_height(height)
+                    if checked_height is None or height > checked_height:
+                        engines.append(engine)
+                        checked_heights.append(checked_height)
+                if not engines:
+                    continue  # no new block
+                if not await self.rpc.conn.get_synced():
+                    continue  # coins look unknown to a wallet that is catching up, check again later
+                # page back far enough for the position checked the longest ago
+                oldest_checked_height = None
+                if None not in checked_heights:
+                    oldest_checked_height = min(typing.cast(list[int], checked_heights))
+
+                orders: dict[bytes32, tuple[int, Order]] = {}
+                for i, engine in enumerate(engines):
+                    position = await engine.db.get_position()
+                    await engine.check_fills(position, height)
+                    engine_orders = await engine.db.get_order(position)
+                    metrics.OPEN_ORDERS.set(len(engine_orders), position=engine.db.position_id)
+                    for order in engine_orders:
+                        orders[order.trade_id] = i, order
+                by_engine: list[list[Order]] = [[] for _ in engines]
+                for i, order in await match_confirmed_trades(self.rpc, orders, oldest_checked_height):
+                    by_engine[i].append(order)
+                results = await asyncio.gather(
+                    *(self._flip_orders(engine, o, height) for engine, o in zip(engines, by_engine)),
+                    return_exceptions=True,
+                )
+            for engine, result in zip(engines, results):
+                if isinstance(result, BaseException):
+                    log.error("could not flip trades of position %s: %r", engine.db.position_id, result)
+                else:
+                    confirmed_trades.extend(result)
+        return confirmed_trades
+
+    @staticmethod
+    async def _flip_orders(engine: Engine, orders: typing.Sequence[Order], height: int) -> typing.Sequence[Order]:
+        orders = await engine.filter_spent(orders)
+        await engine.flip_orders(await engine.db.get_position(), orders, height)
+        await engine.set_checked_height(height)
+        return orders
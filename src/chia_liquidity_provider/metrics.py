@@ -0,0 +1,151 @@
+"""
+Minimal metrics registry, rendered in the Prometheus text exposition format
+"""
+import bisect
+import contextlib
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Iterator, Sequence
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelValues = tuple[str, ...]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: list["Metric"] = []
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self.metrics)
+
+
+REGISTRY = Registry()
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escape = lambda v: v.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+    return "{" + ",".join(f'{n}="{escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Metric(ABC):
+    TYPE: str
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.metrics.append(self)
+
+    def _key(self, labels: dict[str, object]) -> LabelValues:
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> str:
+        return f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.TYPE}\n" + "".join(self._samples())
+
+    @abstractmethod
+    def _samples(self) -> Iterator[str]:
+        ...
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: object) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    @contextlib.contextmanager
+    def count_exceptions(self, **labels: object) -> Iterator[None]:
+        try:
+            yield
+        except Exception:
+            self.inc(**labels)
+            raise
+
+    def _samples(self) -> Iterator[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}\n"
+
+
+class Gauge(Counter):
+    TYPE = "gauge"
+
+    def set(self, value: float, **labels: object) -> None:
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # per label values: count of observations in each bucket (and above the last), then their sum
+        self._values: dict[LabelValues, tuple[list[int], float]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._values[key] = counts, total + value
+
+    def count(self, **labels: object) -> int:
+        counts, _ = self._values.get(self._key(labels)) or ([], 0.0)
+        return sum(counts)
+
+    @contextlib.contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        """
+        Observe the duration of the block, whether it succeeds or not.
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def _samples(self) -> Iterator[str]:
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                labels = _format_labels((*self.labelnames, "le"), (*key, _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}\n"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}\n"
+            yield f"{self.name}_count{labels} {cumulative}\n"
+
+
+SWEEP_SECONDS = Histogram("clp_sweep_seconds", "Time taken to check the open orders of every position.")
+OPEN_ORDERS = Gauge("clp_open_orders", "Orders of the position as of the last sweep.", ["position"])
+FILLS = Counter("clp_fills_total", "Orders found to have been taken.", ["position"])
+OFFERS_CREATED = Counter("clp_offers_created_total", "Offers created by the wallet.", ["position"])
+FLIP_FAILURES = Counter("clp_flip_failures_total", "Taken orders that could not be replaced.", ["position"])
+REQUOTE_SECONDS = Histogram(
+    "clp_requote_seconds", "Time from noticing a fill until its replacement is first published.", ["position"]
+)
+WALLET_RPC_SECONDS = Histogram("clp_wallet_rpc_seconds", "Latency of wallet rpc calls.", ["endpoint"])
+WALLET_RPC_FAILURES = Counter("clp_wallet_rpc_failures_total", "Wallet rpc calls that failed.", ["endpoint"])
+EXCHANGE_POST_SECONDS = Histogram("clp_exchange_post_seconds", "Latency of posting an offer.", ["venue"])
+EXCHANGE_POST_FAILURES = Counter("clp_exchange_post_failures_total", "Offers an exchange did not accept.", ["venue"])
@@ -0,0 +1,214 @@
+"""
+Opt-in profiling: wall time per stage of the engine, plus whole-program cProfile and sampled stacks
+"""
+import collections
+import contextlib
+import cProfile
+import json
+import logging
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SAMPLING_INTERVAL = 0.005  # [s]
+DEFAULT_MAX_STACKS = 10_000
+DEFAULT_SEGMENT_DURATION = 3600  # [s]
+
+
+class StageTimings:
+    def __init__(self) -> None:
+        self.count: collections.Counter[str] = collections.Counter()
+        self.total: collections.Counter[str] = collections.Counter()
+        self.max: dict[str, float] = {}
+
+    def add(self, stage: str, elapsed: float) -> None:
+        self.count[stage] += 1
+        self.total[stage] += elapsed
+        self.max[stage] = max(self.max.get(stage, 0.0), elapsed)
+
+    def to_json_dict(self) -> dict[str, dict[str, float]]:
+        return {
+            stage: {"count": self.count[stage], "total": self.total[stage], "max": self.max[stage]}
+            for stage in sorted(self.total, key=self.total.__getitem__, reverse=True)
+        }
+
+    def format(self) -> str:
+        lines = [f"{'stage':<20} {'count':>7} {'total [s]':>10} {'max [s]':>9}"]
+        for stage, t in self.to_json_dict().items():
+            lines.append(f"{stage:<20} {t['count']:>7} {t['total']:>10.4f} {t['max']:>9.4f}")
+        return "\n".join(lines)
+
+
+class StackSampler:
+    """
+    Periodically record the stack of a thread, folded in the format flamegraph.pl and speedscope read.
+
+    At most `max_stacks` distinct stacks are kept, the samples of any others are counted together as truncated.
+    """
+
+    TRUNCATED = "[truncated]"
+
+    def __init__(
+        self, thread_id: int, interval: float = DEFAULT_SAMPLING_INTERVAL, max_stacks: int = DEFAULT_MAX_STACKS
+    ):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.stacks: collections.Counter[str] = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="clp-stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def reset(self) -> None:
+        self.stacks = collections.Counter()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+            frame = frame.f_back
+        if stack:
+            folded = ";".join(reversed(stack))
+            if folded not in self.stacks and len(self.stacks) >= self.max_stacks:
+                folded = self.TRUNCATED
+            self.stacks[folded] += 1
+
+    def dump(self, path: Path) -> None:
+        # copied in one step, the sampler thread keeps adding to them
+        stacks = dict(self.stacks)
+        with path.open("w") as f:
+            for stack, count in stacks.items():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """
+    Collect stage timings, per tick and overall, and profile the whole process while active.
+
+    The results are written to `directory` at every lap and on `stop`, under a timestamped prefix.
+    The profile and the sampled stacks start over under a new prefix every `segment_duration` seconds,
+    so that they stay bounded however long the process runs.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        name: str,
+        sampling_interval: float = DEFAULT_SAMPLING_INTERVAL,
+        segment_duration: float = DEFAULT_SEGMENT_DURATION,
+    ):
+        self.directory = directory
+        self.name = name
+        self.segment_duration = segment_duration
+        self.tick = StageTimings()
+        self.overall = StageTimings()
+        self._profile = cProfile.Profile()
+        self._sampler = StackSampler(threading.get_ident(), sampling_interval)
+        self._active = False
+        self._prefix = self._segment_prefix()
+        self._segment_start = time.monotonic()
+
+    def add(self, stage: str, elapsed: float) -> None:
+        self.tick.add(stage, elapsed)
+        self.overall.add(stage, elapsed)
+
+    def lap(self) -> StageTimings:
+        """
+        Return the timings since the previous lap, and write out the results so far.
+        """
+        tick, self.tick = self.tick, StageTimings()
+        if self._active:
+            self.write()
+        return tick
+
+    def start(self) -> None:
+        self._prefix = self._segment_prefix()
+        self._segment_start = time.monotonic()
+        self._active = True
+        self._sampler.start()
+        self._profile.enable()
+
+    def stop(self) -> Path:
+        self._profile.disable()
+        self._sampler.stop()
+        self._active = False
+        prefix = self.write()
+        log.info("stage timings:\n%s", self.overall.format())
+        log.info("profile written to %s.{prof,folded,json}", prefix)
+        return prefix
+
+    def write(self) -> Path:
+        """
+        Write the results of the current segment, replacing the ones written before, and return their prefix.
+        """
+        prefix = self._prefix
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._profile.dump_stats(prefix.with_suffix(".prof"))  # which disables the profile
+        self._sampler.dump(prefix.with_suffix(".folded"))
+        prefix.with_suffix(".json").write_text(json.dumps(self.overall.to_json_dict(), indent=2))
+        if self._active:
+            if time.monotonic() - self._segment_start >= self.segment_duration:
+                self._profile = cProfile.Profile()
+                self._sampler.reset()
+                self._prefix = self._segment_prefix()
+                self._segment_start = time.monotonic()
+            self._profile.enable()
+        return prefix
+
+    def _segment_prefix(self) -> Path:
+        return self.directory / f"{self.name}-{datetime.now().strftime('%Y%m%dT%H%M%S')}"
+
+
+# the active profiler, if any
+_profiler: Optional[Profiler] = None
+
+
+@contextlib.contextmanager
+def enabled(profiler: Optional[Profiler]) -> Iterator[Optional[Profiler]]:
+    """
+    Make `profiler` the active one for the duration of the block, if there is one.
+    """
+    global _profiler
+    if profiler is None:
+        yield None
+        return
+    _profiler = profiler
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        _profiler = None
+        profiler.stop()
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Attribute the wall time of the block to stage `name`. Concurrent and nested blocks each count in full.
+    """
+    if _profiler is None:
+        yield
+        return
+    profiler = _profiler
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add(name, time.perf_counter() - start)
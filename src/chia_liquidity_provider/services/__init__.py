@@ -1,2 +1,4 @@
 from .database import DatabaseService
+from .metrics import MetricsService
+from .wallet_events import WalletEventsService
 from .wallet_rpc_client import WalletRpcClientService
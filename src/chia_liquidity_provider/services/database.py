@@ -1,27 +1,88 @@
 import asyncio
+import contextlib
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Sequence
 
 import aiomisc
 import aiosqlite
 import xdg
+from chia.wallet.trading.offer import Offer
 
+from chia_liquidity_provider import profiling
 from chia_liquidity_provider.abc import DatabaseServiceBase
-from chia_liquidity_provider.types.order import OrderTableMixin
+from chia_liquidity_provider.types.checkpoint import CheckpointTableMixin
+from chia_liquidity_provider.types.fill import Fill, FillTableMixin
+from chia_liquidity_provider.types.order import Order, OrderTableMixin
 from chia_liquidity_provider.types.position import PositionTableMixin
+from chia_liquidity_provider.types.publication import Publication, PublicationTableMixin
+from chia_liquidity_provider.types.snapshot import TradeSnapshotTableMixin
 
 DEFAULT_STATE_DIRECTORY = xdg.xdg_state_home() / "clp"
 
 
-class DatabaseService(aiomisc.Service, PositionTableMixin, OrderTableMixin, DatabaseServiceBase):
+async def _add_order_rung(conn: aiosqlite.Connection) -> None:
+    async with conn.execute(f"PRAGMA table_info({Order.TABLE_NAME})") as cursor:
+        columns = {row["name"] for row in await cursor.fetchall()}
+    if "rung" not in columns:
+        await conn.execute(f"ALTER TABLE {Order.TABLE_NAME} ADD COLUMN rung INTEGER")
+
+
+async def _index_publications(conn: aiosqlite.Connection) -> None:
+    await conn.execute(
+        f"CREATE INDEX IF NOT EXISTS publications_next_attempt ON {Publication.TABLE_NAME}(next_attempt)"
+    )
+    await conn.execute(
+        f"CREATE INDEX IF NOT EXISTS publications_unattempted ON {Publication.TABLE_NAME}(attempts) WHERE attempts = 0"
+    )
+
+
+async def _encode_publications(conn: aiosqlite.Connection) -> None:
+    # publications used to hold the serialized offer
+    async with conn.execute(
+        f"SELECT rowid, offer FROM {Publication.TABLE_NAME} WHERE typeof(offer) = 'blob'"
+    ) as cursor:
+        rows = await cursor.fetchall()
+    # encoded here rather than lazily on the database thread, chia's puzzles cannot be used from another thread
+    updates = [(Offer.from_bytes(row["offer"]).to_bech32(), row["rowid"]) for row in rows]
+    await conn.executemany(f"UPDATE {Publication.TABLE_NAME} SET offer = ? WHERE rowid = ?", updates)
+
+
+async def _add_fill_undone(conn: aiosqlite.Connection) -> None:
+    async with conn.execute(f"PRAGMA table_info({Fill.TABLE_NAME})") as cursor:
+        columns = {row["name"] for row in await cursor.fetchall()}
+    if "undone" not in columns:
+        await conn.execute(f"ALTER TABLE {Fill.TABLE_NAME} ADD COLUMN undone INTEGER NOT NULL DEFAULT 0")
+
+
+# Schema migrations, the database's user_version is the number of migrations applied to it.
+# Tables are created in their latest shape, so migrations must be no-ops when already applied. Append only.
+MIGRATIONS: Sequence[Callable[[aiosqlite.Connection], Awaitable[None]]] = [
+    _add_order_rung,
+    _index_publications,
+    _encode_publications,
+    _add_fill_undone,
+]
+
+
+class DatabaseService(
+    aiomisc.Service,
+    PositionTableMixin,
+    OrderTableMixin,
+    PublicationTableMixin,
+    TradeSnapshotTableMixin,
+    CheckpointTableMixin,
+    FillTableMixin,
+    DatabaseServiceBase,
+):
     """
     Mediate access to the database
     """
 
     _conn: aiosqlite.Connection
     _location: Path
+    _lock: asyncio.Lock
 
     def __init__(self, position_id: str = "default", state_dir: Optional[Path] = None, **kwargs: Any):
         super().__init__(**kwargs)
@@ -35,17 +96,55 @@ class DatabaseService(aiomisc.Service, PositionTableMixin, OrderTableMixin, Data
 
         if "/" in position_id:
             raise ValueError("bad position_id")
+        self._position_id = position_id
         self._location /= f"{position_id}.sqlite"
 
     async def start(self) -> None:
         self._conn = await aiosqlite.connect(self._location)
         self._conn.row_factory = aiosqlite.Row
+        self._lock = asyncio.Lock()
+        # WAL makes commits cheap, at worst a power loss forgets the last few of them
+        await self._conn.execute("PRAGMA journal_mode = WAL")
+        await self._conn.execute("PRAGMA synchronous = NORMAL")
+        await self._conn.execute("PRAGMA temp_store = MEMORY")
         await self._start_hook()
+        await self._migrate()
+        await self._conn.commit()
+
+    async def _migrate(self) -> None:
+        async with self._conn.execute("PRAGMA user_version") as cursor:
+            (version,) = await cursor.fetchone()
+        for migration in MIGRATIONS[version:]:
+            await migration(self._conn)
+        # PRAGMA does not take parameters
+        await self._conn.execute(f"PRAGMA user_version = {len(MIGRATIONS):d}")
 
     async def stop(self, exception: Optional[Exception] = None) -> None:
         await super().stop(exception)
         await self._conn.close()
 
+    @property
+    def position_id(self) -> str:
+        return self._position_id
+
     @property
     def conn(self) -> aiosqlite.Connection:
         return self._conn
+
+    @contextlib.asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Group writes so that they are committed together or not at all.
+
+        All writers share one connection, so transactions are serialized.
+        """
+        async with self._lock:
+            try:
+                yield self._conn
+            except BaseException:
+                await self._conn.rollback()
+                self._rollback_hook()
+                raise
+            else:
+                with profiling.stage("db_commit"):
+                    await self._conn.commit()
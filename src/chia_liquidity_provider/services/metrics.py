@@ -0,0 +1,27 @@
+from typing import Any
+
+from aiohttp import web
+from aiomisc.service.aiohttp import AIOHTTPService
+
+from chia_liquidity_provider.metrics import REGISTRY, Registry
+
+
+class MetricsService(AIOHTTPService):
+    """
+    Expose metrics over http for Prometheus to scrape
+    """
+
+    def __init__(self, registry: Registry = REGISTRY, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._registry = registry
+
+    async def create_application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        return app
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self._registry.render().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import pathlib
+import ssl
+from typing import Any, Optional
+
+import aiohttp
+import aiomisc
+from chia.server.server import ssl_context_for_client
+from chia.util.config import load_config
+from chia.util.default_root import DEFAULT_ROOT_PATH
+from chia.util.ws_message import create_payload_dict
+
+log = logging.getLogger(__name__)
+
+# wallet state changes after which an offer may have changed status
+WAKEUP_STATES = frozenset(
+    {
+        "new_block",
+        "coin_added",
+        "coin_removed",
+        "offer_added",
+        "offer_cancelled",
+        "tx_update",
+    }
+)
+
+
+class WalletEventsService(aiomisc.Service):
+    """
+    Listen to wallet state changes relayed by the chia daemon websocket
+    """
+
+    _changed: asyncio.Event
+    _session: aiohttp.ClientSession
+    _task: asyncio.Task
+
+    def __init__(
+        self,
+        uri: Optional[str] = None,
+        ssl_context: Optional[ssl.SSLContext] = None,
+        reconnect_delay: float = 5,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self._uri = uri
+        self._ssl_context = ssl_context
+        self._reconnect_delay = reconnect_delay
+        self._connected = False
+
+    async def start(self) -> None:
+        if self._uri is None:
+            root_path = pathlib.Path(os.environ.get("CHIA_ROOT", DEFAULT_ROOT_PATH))
+            config = load_config(root_path, "config.yaml")
+            self._uri = f"wss://{config['self_hostname']}:{config['daemon_port']}"
+            self._ssl_context = ssl_context_for_client(
+                root_path / config["private_ssl_ca"]["crt"],
+                root_path / config["private_ssl_ca"]["key"],
+                root_path / config["daemon_ssl"]["private_crt"],
+                root_path / config["daemon_ssl"]["private_key"],
+            )
+        self._changed = asyncio.Event()
+        self._session = aiohttp.ClientSession()
+        self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self, exc: Optional[Exception] = None) -> None:
+        await super().stop(exc)
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        await self._session.close()
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    async def wait_for_change(self, timeout: float) -> bool:
+        """
+        Wait until the wallet reports a relevant state change, or until `timeout` seconds have elapsed.
+        Returns whether a change was observed.
+        """
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._changed.clear()
+        return True
+
+    async def _listen_forever(self) -> None:
+        while True:
+            try:
+                await self._listen()
+            except (aiohttp.ClientError, OSError) as err:
+                log.warning("lost connection to the chia daemon: %s", err)
+            await asyncio.sleep(self._reconnect_delay)
+
+    async def _listen(self) -> None:
+        assert self._uri is not None
+        async with self._session.ws_connect(self._uri, ssl=self._ssl_context or True, heartbeat=60) as ws:
+            await ws.send_json(create_payload_dict("register_service", {"service": "wallet_ui"}, "clp", "daemon"))
+            self._connected = True
+            log.info("listening to wallet events")
+            # we may have missed events while disconnected
+            self._changed.set()
+            try:
+                async for msg in ws:
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        continue
+                    payload = msg.json()
+                    if payload.get("command") != "state_changed":
+                        continue
+                    if payload.get("data", {}).get("state") in WAKEUP_STATES:
+                        self._changed.set()
+            finally:
+                self._connected = False
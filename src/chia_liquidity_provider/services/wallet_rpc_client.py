@@ -1,7 +1,9 @@
+import asyncio
+import contextlib
 import os
 import pathlib
 from decimal import Decimal, localcontext
-from typing import Optional, Union
+from typing import Any, AsyncIterator, Optional, Union
 
 import aiomisc
 from chia.rpc.wallet_rpc_client import WalletRpcClient
@@ -10,6 +12,19 @@ from chia.util.config import load_config
 from chia.util.default_root import DEFAULT_ROOT_PATH
 from chia.util.ints import uint16, uint32, uint64
 
+from chia_liquidity_provider import metrics
+
+
+class InstrumentedWalletRpcClient(WalletRpcClient):
+    """
+    Wallet rpc client that records the latency and failures of every call
+    """
+
+    async def fetch(self, path, request_json) -> Any:
+        with metrics.WALLET_RPC_SECONDS.time(endpoint=path):
+            with metrics.WALLET_RPC_FAILURES.count_exceptions(endpoint=path):
+                return await super().fetch(path, request_json)
+
 
 class WalletRpcClientService(aiomisc.Service):
     """
@@ -17,14 +32,20 @@ class WalletRpcClientService(aiomisc.Service):
     """
 
     _conn: WalletRpcClient
+    _login_condition: asyncio.Condition
 
     def __init__(self, fingerprint: Optional[int] = None):
         self._fingerprint = fingerprint
+        self._logged_in_fingerprint: Optional[int] = None
+        self._logged_in_users = 0
 
     async def start(self) -> None:
         root_path = pathlib.Path(os.environ.get("CHIA_ROOT", DEFAULT_ROOT_PATH))
         config = load_config(root_path, "config.yaml")
-        self._conn = await WalletRpcClient.create("localhost", config["wallet"]["rpc_port"], root_path, config)
+        self._conn = await InstrumentedWalletRpcClient.create(
+            "localhost", config["wallet"]["rpc_port"], root_path, config
+        )
+        self._login_condition = asyncio.Condition()
         fingerprint = self._fingerprint
         if fingerprint is not None:
             rep = await self._conn.log_in(fingerprint)
@@ -39,3 +60,28 @@ class WalletRpcClientService(aiomisc.Service):
     @property
     def conn(self) -> WalletRpcClient:
         return self._conn
+
+    @contextlib.asynccontextmanager
+    async def logged_in(self, fingerprint: int) -> AsyncIterator[WalletRpcClient]:
+        """
+        Keep the wallet logged in with `fingerprint` for the duration of the block.
+
+        Users of the same fingerprint share the wallet, users of other fingerprints wait their turn.
+        """
+        async with self._login_condition:
+            await self._login_condition.wait_for(
+                lambda: self._logged_in_users == 0 or self._logged_in_fingerprint == fingerprint
+            )
+            if self._logged_in_users == 0:
+                # log in even if we think we are, someone else may have switched keys
+                rep = await self._conn.log_in(fingerprint)
+                if rep["success"] is False:
+                    raise Exception("error logging in", rep)
+                self._logged_in_fingerprint = fingerprint
+            self._logged_in_users += 1
+        try:
+            yield self._conn
+        finally:
+            async with self._login_condition:
+                self._logged_in_users -= 1
+                self._login_condition.notify_all()
@@ -1,4 +1,32 @@
-from .asset import Asset
-from .grid import Grid
-from .order import Order
-from .position import Position
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .asset import Asset
+    from .fill import Fill
+    from .grid import Grid
+    from .order import Order
+    from .position import Position
+    from .publication import Publication
+    from .snapshot import TradeSnapshot
+
+# imported on first access, the database types need the database stack while `Asset` and `Grid` do not
+_EXPORTS = {
+    "Asset": ".asset",
+    "Fill": ".fill",
+    "Grid": ".grid",
+    "Order": ".order",
+    "Position": ".position",
+    "Publication": ".publication",
+    "TradeSnapshot": ".snapshot",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,29 @@
+from typing import Optional
+
+from chia_liquidity_provider.abc import DatabaseServiceBase
+
+CHECKPOINTS_TABLE_NAME = "checkpoints"
+
+
+class CheckpointTableMixin(DatabaseServiceBase):
+    """
+    Remember up to which wallet height some piece of work has been done
+    """
+
+    async def _start_hook(self) -> None:
+        await super()._start_hook()
+        fields = ",".join(
+            [
+                "name TEXT UNIQUE NOT NULL",
+                "height INTEGER NOT NULL",
+            ]
+        )
+        await self.conn.execute(f"CREATE TABLE IF NOT EXISTS {CHECKPOINTS_TABLE_NAME}({fields})")
+
+    async def get_checkpoint(self, name: str) -> Optional[int]:
+        async with self.conn.execute(f"SELECT height FROM {CHECKPOINTS_TABLE_NAME} WHERE name = ?", (name,)) as cursor:
+            row = await cursor.fetchone()
+        return None if row is None else row["height"]
+
+    async def set_checkpoint(self, name: str, height: int) -> None:
+        await self.conn.execute(f"INSERT OR REPLACE INTO {CHECKPOINTS_TABLE_NAME} VALUES(?, ?)", (name, height))
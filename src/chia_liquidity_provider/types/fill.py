@@ -0,0 +1,95 @@
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+
+from chia_liquidity_provider.abc import DatabaseServiceBase
+from chia_liquidity_provider.types.order import Order
+
+
+@dataclass(frozen=True)
+class Fill:
+    """
+    An order that was taken and replaced, remembered while a reorg could still undo it.
+
+    The order was taken by the spend of `coin_ids`, confirmed at `height`.
+    `rolled_back_height` is the wallet height at which these coins were first seen unspent again, if they were.
+    An `undone` fill stayed rolled back long enough for the order to be reopened in place of its replacement,
+    which was already posted: the order is taken again by the same spend, and the replacement with it.
+    """
+
+    TABLE_NAME = "fills"
+    order: Order
+    replacement_id: bytes32
+    coin_ids: tuple[bytes32, ...]
+    height: int
+    rolled_back_height: Optional[int] = None
+    undone: bool = False
+
+
+class FillTableMixin(DatabaseServiceBase):
+    async def _start_hook(self) -> None:
+        await super()._start_hook()
+        fields = ",".join(
+            [
+                "trade_id BLOB UNIQUE NOT NULL",
+                "base_delta INTEGER NOT NULL",
+                "quote_delta INTEGER NOT NULL",
+                "rung INTEGER",
+                "replacement_id BLOB NOT NULL",
+                "coin_ids BLOB NOT NULL",  # concatenated
+                "height INTEGER NOT NULL",
+                "rolled_back_height INTEGER",
+                "undone INTEGER NOT NULL DEFAULT 0",
+            ]
+        )
+        await self.conn.execute(f"CREATE TABLE IF NOT EXISTS {Fill.TABLE_NAME}({fields})")
+
+    async def insert_fills(self, fills: Iterable[Fill]) -> None:
+        await self.conn.executemany(
+            f"INSERT OR REPLACE INTO {Fill.TABLE_NAME} VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    fill.order.trade_id,
+                    fill.order.base_delta,
+                    fill.order.quote_delta,
+                    fill.order.rung,
+                    fill.replacement_id,
+                    b"".join(fill.coin_ids),
+                    fill.height,
+                    fill.rolled_back_height,
+                    fill.undone,
+                )
+                for fill in fills
+            ),
+        )
+
+    async def get_fills(self) -> Sequence[Fill]:
+        r = []
+        async with self.conn.execute(f"SELECT * FROM {Fill.TABLE_NAME} ORDER BY height DESC") as cursor:
+            for row in await cursor.fetchall():
+                coin_ids = row["coin_ids"]
+                r.append(
+                    Fill(
+                        Order(bytes32(row["trade_id"]), row["base_delta"], row["quote_delta"], row["rung"]),
+                        bytes32(row["replacement_id"]),
+                        tuple(bytes32(coin_ids[i : i + 32]) for i in range(0, len(coin_ids), 32)),
+                        row["height"],
+                        row["rolled_back_height"],
+                        bool(row["undone"]),
+                    )
+                )
+        return r
+
+    async def delete_fills(self, trade_ids: Iterable[bytes32]) -> None:
+        await self.conn.executemany(
+            f"DELETE FROM {Fill.TABLE_NAME} WHERE trade_id = ?", ((trade_id,) for trade_id in trade_ids)
+        )
+
+    async def delete_settled_fills(self, height: int) -> None:
+        """
+        Forget the fills confirmed at or below `height`, unless they have been rolled back.
+        """
+        await self.conn.execute(
+            f"DELETE FROM {Fill.TABLE_NAME} WHERE height <= ? AND rolled_back_height IS NULL", (height,)
+        )
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from decimal import Decimal, localcontext
 from typing import Optional, Sequence, Union
 
@@ -14,37 +14,104 @@ class Grid:
 
     base_amount: uint64
     quote_amounts: list[uint64]
+    # what selling base brings in at each point, when it is rounded apart from what buying it costs
+    sell_quote_amounts: Optional[list[uint64]] = None
+    # (side, quote amount) -> rung, to recognize orders that predate rung tracking
+    _rungs: dict[tuple[bool, int], int] = field(init=False, repr=False, compare=False)
+    # the largest coin an order may be funded by
+    _max_quote_amount: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        rungs: dict[tuple[bool, int], int] = {}
+        for rung in range(1, len(self.quote_amounts)):
+            rungs.setdefault((False, self._sell_quote_amounts[rung - 1]), rung)
+            rungs.setdefault((True, self.quote_amounts[rung]), rung)
+        object.__setattr__(self, "_rungs", rungs)
+        object.__setattr__(self, "_max_quote_amount", max(*self.quote_amounts, *self._sell_quote_amounts))
+
+    @property
+    def _sell_quote_amounts(self) -> list[uint64]:
+        return self.quote_amounts if self.sell_quote_amounts is None else self.sell_quote_amounts
 
     @classmethod
     def make(cls, curve, base_increment, base_total_amount):
-        quote_amounts = []
-        for x in range(0, base_total_amount + base_increment, base_increment):
-            Δy = uint64(curve.f(x) - curve.f(x + base_increment))
-            quote_amounts.append(Δy)
-        return cls(base_amount=base_increment, quote_amounts=quote_amounts)
+        # evaluate every point once, each rung is the difference between neighbors
+        bids, asks = curve.quote_deltas(range(0, base_total_amount + 2 * base_increment, base_increment))
+        quote_amounts = [uint64(Δy) for Δy in bids]
+        sell_quote_amounts = [uint64(Δy) for Δy in asks]
+        if sell_quote_amounts == quote_amounts:
+            return cls(base_amount=base_increment, quote_amounts=quote_amounts)
+        return cls(base_amount=base_increment, quote_amounts=quote_amounts, sell_quote_amounts=sell_quote_amounts)
 
-    def initial_orders(self, price):
+    def initial_rungs(self, price):
+        """
+        Yield the rung and base delta of each initial order.
+        """
         for i in range(1, len(self.quote_amounts)):
             if self.quote_amounts[i] / self.base_amount > price:
-                yield -self.base_amount, self.quote_amounts[i - 1]
+                yield i, -self.base_amount
             else:
-                yield self.base_amount, -self.quote_amounts[i]
+                yield i, self.base_amount
+
+    def initial_orders(self, price):
+        for rung, base_amount in self.initial_rungs(price):
+            yield self.order(rung, base_amount)
+
+    def order(self, rung, base_amount):
+        """
+        Return the base and quote deltas of the order at `rung`.
 
-    def flip(self, base_amount, quote_amount):
+        Rung i sells base for sell_quote_amounts[i - 1] (quote_amounts[i - 1] unless they are rounded apart)
+        or buys it back for quote_amounts[i], so an order stays on its rung when it is flipped.
+        """
+        if not 1 <= rung < len(self.quote_amounts):
+            raise ValueError()
+        if base_amount == self.base_amount:
+            return self.base_amount, -self.quote_amounts[rung]
+        if base_amount == -self.base_amount:
+            return -self.base_amount, self._sell_quote_amounts[rung - 1]
+        raise ValueError()
+
+    def coin_amounts(self, rung, base_amount):
+        """
+        Return the smallest and largest coin that may fund the order at `rung`.
+
+        An order is funded by a single coin of the position, from the initial split or from a fill,
+        so it never locks several coins nor one of the wallet's other, larger coins.
+        """
+        base_delta, quote_delta = self.order(rung, base_amount)
+        if base_delta < 0:
+            return self.base_amount, self.base_amount
+        return -quote_delta, self._max_quote_amount
+
+    def rung(self, base_amount, quote_amount):
+        """
+        Find the rung of an order from its amounts.
+
+        This is ambiguous when two rungs have the same quote amount, prefer storing the rung.
+        """
         if base_amount not in (-self.base_amount, self.base_amount):
             raise ValueError()
-        if quote_amount < 0:
-            quote_amount = self.quote_amounts[(i := self.quote_amounts.index(-quote_amount) - 1)]
-            if i < 0:
-                raise ValueError()
-        else:
-            quote_amount = -self.quote_amounts[self.quote_amounts.index(quote_amount) + 1]
-        base_amount = -base_amount
-        return base_amount, quote_amount
+        try:
+            return self._rungs[base_amount > 0, abs(quote_amount)]
+        except KeyError:
+            raise ValueError() from None
+
+    def flip(self, base_amount, quote_amount, rung=None):
+        if rung is None:
+            rung = self.rung(base_amount, quote_amount)
+        return self.order(rung, -base_amount)
 
     def to_json_dict(self):
-        return {"base_amount": self.base_amount, "quote_amounts": self.quote_amounts}
+        d = {"base_amount": self.base_amount, "quote_amounts": self.quote_amounts}
+        if self.sell_quote_amounts is not None:
+            d["sell_quote_amounts"] = self.sell_quote_amounts
+        return d
 
     @classmethod
     def from_json_dict(cls, d):
-        return cls(base_amount=d["base_amount"], quote_amounts=d["quote_amounts"])
+        return cls(
+            base_amount=d["base_amount"],
+            quote_amounts=d["quote_amounts"],
+            sell_quote_amounts=d.get("sell_quote_amounts"),
+        )
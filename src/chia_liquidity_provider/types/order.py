@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Sequence
+from typing import TYPE_CHECKING, Iterable, Optional, Sequence
 
 from chia.types.blockchain_format.sized_bytes import bytes32
 
@@ -15,6 +15,7 @@ class Order:
     trade_id: bytes32
     base_delta: int
     quote_delta: int
+    rung: Optional[int] = None  # unknown for orders created by older versions
 
 
 class OrderTableMixin(DatabaseServiceBase):
@@ -25,27 +26,32 @@ class OrderTableMixin(DatabaseServiceBase):
                 "trade_id BLOB UNIQUE NOT NULL",
                 "base_delta INTEGER NOT NULL",
                 "quote_delta INTEGER NOT NULL",
+                "rung INTEGER",
                 # No position foreign key since the position is locally unique
             ]
         )
         await self.conn.execute(f"CREATE TABLE IF NOT EXISTS {Order.TABLE_NAME}({fields})")
 
-    async def insert_order(self, _: "Position", order: Order) -> None:
-        await self.conn.execute(
-            f"INSERT OR IGNORE INTO {Order.TABLE_NAME} VALUES(?, ?, ?)",
-            (
-                order.trade_id,
-                order.base_delta,
-                order.quote_delta,
-            ),
+    async def insert_order(self, position: "Position", order: Order) -> None:
+        await self.insert_orders(position, [order])
+
+    async def insert_orders(self, _: "Position", orders: Iterable[Order]) -> None:
+        await self.conn.executemany(
+            f"INSERT OR IGNORE INTO {Order.TABLE_NAME}(trade_id, base_delta, quote_delta, rung) VALUES(?, ?, ?, ?)",
+            ((order.trade_id, order.base_delta, order.quote_delta, order.rung) for order in orders),
         )
 
     async def get_order(self, _: "Position") -> Sequence[Order]:
         r = []
         async with self.conn.execute(f"SELECT * FROM {Order.TABLE_NAME}") as cursor:
             for row in await cursor.fetchall():
-                r.append(Order(bytes32(row["trade_id"]), row["base_delta"], row["quote_delta"]))
+                r.append(Order(bytes32(row["trade_id"]), row["base_delta"], row["quote_delta"], row["rung"]))
         return r
 
     async def delete_order(self, order: Order) -> None:
-        await self.conn.execute(f"DELETE FROM {Order.TABLE_NAME} WHERE trade_id = ?", (order.trade_id,))
+        await self.delete_orders([order])
+
+    async def delete_orders(self, orders: Iterable[Order]) -> None:
+        await self.conn.executemany(
+            f"DELETE FROM {Order.TABLE_NAME} WHERE trade_id = ?", ((order.trade_id,) for order in orders)
+        )
@@ -1,5 +1,6 @@
 import json
 from dataclasses import dataclass
+from typing import Optional
 
 from chia_liquidity_provider.abc import DatabaseServiceBase
 
@@ -22,6 +23,13 @@ class Position:
 
 
 class PositionTableMixin(DatabaseServiceBase):
+    # decoded copy of the position, dropped on every write
+    _position: Optional[Position] = None
+
+    def _rollback_hook(self) -> None:
+        super()._rollback_hook()
+        self._position = None
+
     async def _start_hook(self) -> None:
         await super()._start_hook()
         fields = ",".join(
@@ -35,6 +43,7 @@ class PositionTableMixin(DatabaseServiceBase):
         await self.conn.execute(f"CREATE TABLE IF NOT EXISTS {Position.TABLE_NAME}({fields})")
 
     async def init_position(self, position: Position) -> None:
+        self._position = None
         await self.conn.execute(
             f"INSERT OR IGNORE INTO {Position.TABLE_NAME} VALUES(?, ?, ?, ?)",
             (
@@ -46,12 +55,15 @@ class PositionTableMixin(DatabaseServiceBase):
         )
 
     async def get_position(self) -> Position:
+        if self._position is not None:
+            return self._position
         async with self.conn.execute(f"SELECT * FROM {Position.TABLE_NAME}") as cursor:
             for row in await cursor.fetchall():
-                return Position(
+                self._position = Position(
                     fingerprint=row["fingerprint"],
                     base_asset_wallet_id=uint32(row["base_asset_wallet_id"]),
                     quote_asset_wallet_id=uint32(row["quote_asset_wallet_id"]),
                     grid=Grid.from_json_dict(json.loads(row["grid"])),
                 )
+                return self._position
         raise RuntimeError("no position found")
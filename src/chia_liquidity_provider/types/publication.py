@@ -0,0 +1,95 @@
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+
+from chia_liquidity_provider.abc import DatabaseServiceBase
+
+
+@dataclass(frozen=True)
+class Publication:
+    """
+    An offer waiting to be posted to an exchange, bech32 encoded.
+    """
+
+    TABLE_NAME = "publications"
+    trade_id: bytes32
+    venue: str
+    offer: str
+    attempts: int = 0
+    next_attempt: float = 0  # unix timestamp
+
+
+class PublicationTableMixin(DatabaseServiceBase):
+    async def _start_hook(self) -> None:
+        await super()._start_hook()
+        fields = ",".join(
+            [
+                "trade_id BLOB NOT NULL",
+                "venue TEXT NOT NULL",
+                "offer TEXT NOT NULL",
+                "attempts INTEGER NOT NULL",
+                "next_attempt REAL NOT NULL",
+                "UNIQUE(trade_id, venue)",
+            ]
+        )
+        await self.conn.execute(f"CREATE TABLE IF NOT EXISTS {Publication.TABLE_NAME}({fields})")
+
+    async def insert_publication(self, publication: Publication) -> None:
+        await self.insert_publications([publication])
+
+    async def insert_publications(self, publications: Iterable[Publication]) -> None:
+        await self.conn.executemany(
+            f"INSERT OR IGNORE INTO {Publication.TABLE_NAME} VALUES(?, ?, ?, ?, ?)",
+            (
+                (
+                    publication.trade_id,
+                    publication.venue,
+                    publication.offer,
+                    publication.attempts,
+                    publication.next_attempt,
+                )
+                for publication in publications
+            ),
+        )
+
+    async def get_due_publications(self, now: float, limit: int) -> Sequence[Publication]:
+        r = []
+        async with self.conn.execute(
+            f"SELECT * FROM {Publication.TABLE_NAME} WHERE next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+            (now, limit),
+        ) as cursor:
+            for row in await cursor.fetchall():
+                r.append(
+                    Publication(
+                        bytes32(row["trade_id"]), row["venue"], row["offer"], row["attempts"], row["next_attempt"]
+                    )
+                )
+        return r
+
+    async def get_next_publication_time(self) -> Optional[float]:
+        async with self.conn.execute(f"SELECT MIN(next_attempt) FROM {Publication.TABLE_NAME}") as cursor:
+            row = await cursor.fetchone()
+        return row[0]
+
+    async def count_unattempted_publications(self) -> int:
+        async with self.conn.execute(f"SELECT COUNT(*) FROM {Publication.TABLE_NAME} WHERE attempts = 0") as cursor:
+            row = await cursor.fetchone()
+        return row[0]
+
+    async def reschedule_publication(self, publication: Publication, next_attempt: float) -> None:
+        await self.conn.execute(
+            f"UPDATE {Publication.TABLE_NAME} SET attempts = ?, next_attempt = ? WHERE trade_id = ? AND venue = ?",
+            (publication.attempts + 1, next_attempt, publication.trade_id, publication.venue),
+        )
+
+    async def delete_publication(self, publication: Publication) -> None:
+        await self.conn.execute(
+            f"DELETE FROM {Publication.TABLE_NAME} WHERE trade_id = ? AND venue = ?",
+            (publication.trade_id, publication.venue),
+        )
+
+    async def delete_publications(self, trade_ids: Iterable[bytes32]) -> None:
+        await self.conn.executemany(
+            f"DELETE FROM {Publication.TABLE_NAME} WHERE trade_id = ?", ((trade_id,) for trade_id in trade_ids)
+        )
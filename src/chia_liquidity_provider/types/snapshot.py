@@ -0,0 +1,71 @@
+from dataclasses import dataclass
+from typing import Iterable
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.wallet.trading.trade_status import TradeStatus
+
+from chia_liquidity_provider.abc import DatabaseServiceBase
+
+# a trade in one of these states will not change anymore
+FINAL_TRADE_STATUSES = frozenset({TradeStatus.CONFIRMED.value, TradeStatus.CANCELLED.value, TradeStatus.FAILED.value})
+
+
+@dataclass(frozen=True)
+class TradeSnapshot:
+    """
+    What we last knew of a trade: its status, and the coins it locks.
+
+    As long as none of these coins is spent, the status cannot have changed.
+    """
+
+    TABLE_NAME = "trade_snapshots"
+    trade_id: bytes32
+    status: int
+    coin_ids: tuple[bytes32, ...]
+
+    @property
+    def final(self) -> bool:
+        return self.status in FINAL_TRADE_STATUSES
+
+
+class TradeSnapshotTableMixin(DatabaseServiceBase):
+    async def _start_hook(self) -> None:
+        await super()._start_hook()
+        fields = ",".join(
+            [
+                "trade_id BLOB UNIQUE NOT NULL",
+                "status INTEGER NOT NULL",
+                "coin_ids BLOB NOT NULL",  # concatenated
+            ]
+        )
+        await self.conn.execute(f"CREATE TABLE IF NOT EXISTS {TradeSnapshot.TABLE_NAME}({fields})")
+
+    async def insert_trade_snapshots(self, snapshots: Iterable[TradeSnapshot]) -> None:
+        await self.conn.executemany(
+            f"INSERT OR REPLACE INTO {TradeSnapshot.TABLE_NAME} VALUES(?, ?, ?)",
+            ((s.trade_id, s.status, b"".join(s.coin_ids)) for s in snapshots),
+        )
+
+    async def update_trade_statuses(self, statuses: Iterable[tuple[bytes32, int]]) -> None:
+        await self.conn.executemany(
+            f"UPDATE {TradeSnapshot.TABLE_NAME} SET status = ? WHERE trade_id = ?",
+            ((status, trade_id) for trade_id, status in statuses),
+        )
+
+    async def get_trade_snapshots(self) -> dict[bytes32, TradeSnapshot]:
+        r = {}
+        async with self.conn.execute(f"SELECT * FROM {TradeSnapshot.TABLE_NAME}") as cursor:
+            for row in await cursor.fetchall():
+                coin_ids = row["coin_ids"]
+                trade_id = bytes32(row["trade_id"])
+                r[trade_id] = TradeSnapshot(
+                    trade_id,
+                    row["status"],
+                    tuple(bytes32(coin_ids[i : i + 32]) for i in range(0, len(coin_ids), 32)),
+                )
+        return r
+
+    async def delete_trade_snapshots(self, trade_ids: Iterable[bytes32]) -> None:
+        await self.conn.executemany(
+            f"DELETE FROM {TradeSnapshot.TABLE_NAME} WHERE trade_id = ?", ((trade_id,) for trade_id in trade_ids)
+        )
@@ -0,0 +1,16 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BENCHMARKS = Path(__file__).parent.parent / "benchmarks"
+
+
+def test_engine_benchmark(tmp_path):
+    # a small grid, just to keep the benchmark and its fakes working
+    results = tmp_path / "results.json"
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    subprocess.run(
+        [sys.executable, BENCHMARKS / "engine.py", "--rungs", "10", "--save", results], env=env, check=True, timeout=300
+    )
+    assert results.exists()
@@ -0,0 +1,18 @@
+import pytest
+from chia.consensus.coinbase import create_puzzlehash_for_pk
+from chia.util.keychain import KeyData, generate_mnemonic
+from chia.wallet.derive_keys import master_sk_to_wallet_sk
+
+from chia_liquidity_provider.engine import DERIVATION_CHUNK_SIZE, derive_puzzle_hashes
+
+
+@pytest.fixture
+def services():
+    return []
+
+
+async def test_derive_puzzle_hashes():
+    sk = KeyData.from_mnemonic(generate_mnemonic()).private_key
+    start, count = 5, 2 * DERIVATION_CHUNK_SIZE + 1  # several worker processes
+    expected = [create_puzzlehash_for_pk(master_sk_to_wallet_sk(sk, i).get_g1()) for i in range(start, start + count)]
+    assert await derive_puzzle_hashes(sk, start, count) == expected
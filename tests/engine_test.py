@@ -24,12 +24,12 @@ TRILLION = 1_000_000_000_000
 
 @pytest.fixture
 def dexie():
-    return Mock(spec=dexie_api.testnet)
+    return Mock(spec=dexie_api.Api)
 
 
 @pytest.fixture
 def hashgreen():
-    return Mock(spec=hashgreen_api.mainnet)
+    return Mock(spec=hashgreen_api.Api)
 
 
 @pytest.fixture
@@ -37,6 +37,23 @@ def services(db, rpc):
     return [db, rpc]
 
 
+@pytest.fixture
+async def from_scratch():
+    """
+    Create engines like `Engine.from_scratch`, and close them once the test is done.
+    """
+    engines = []
+
+    async def from_scratch(*args):
+        engine = await Engine.from_scratch(*args)
+        engines.append(engine)
+        return engine
+
+    yield from_scratch
+    for engine in engines:
+        await engine.close()
+
+
 @pytest.fixture
 def switch_fingerprint(rpc):
     @aiomisc.asyncretry(max_tries=100, exceptions=(aiohttp.client_exceptions.ClientConnectorError,), pause=1)
@@ -105,7 +122,7 @@ async def test_wallet(rpc, switch_fingerprint, wait_until_synced, wait_until_set
 
 
 async def test_coin_create_offers(
-    test_wallet, rpc, switch_fingerprint, wait_until_synced, wait_until_settled, db, dexie, hashgreen
+    test_wallet, rpc, switch_fingerprint, wait_until_synced, wait_until_settled, db, dexie, hashgreen, from_scratch
 ):
     await switch_fingerprint(test_wallet.fingerprint)
     await wait_until_settled(int(XCH_WALLET_ID))
@@ -127,7 +144,7 @@ async def test_coin_create_offers(
     p_min = 60 * test_wallet.cat / (1 * XCH)
     p_max = 200 * test_wallet.cat / (1 * XCH)
     curve = LiquidityCurve.make_out_of_range(x_max, p_min, p_max)
-    await Engine.from_scratch(
+    await from_scratch(
         XCH,
         test_wallet.cat,
         0.0,
@@ -149,7 +166,7 @@ async def test_coin_create_offers(
 
 
 async def test_cat_create_offers(
-    test_wallet, rpc, switch_fingerprint, wait_until_synced, wait_until_settled, db, dexie, hashgreen
+    test_wallet, rpc, switch_fingerprint, wait_until_synced, wait_until_settled, db, dexie, hashgreen, from_scratch
 ):
     await switch_fingerprint(test_wallet.fingerprint)
     await wait_until_settled(int(XCH_WALLET_ID))
@@ -171,7 +188,7 @@ async def test_cat_create_offers(
     p_min = 60 * XCH / (1 * test_wallet.cat)
     p_max = 200 * XCH / (1 * test_wallet.cat)
     curve = LiquidityCurve.make_out_of_range(x_max, p_min, p_max)
-    await Engine.from_scratch(
+    await from_scratch(
         test_wallet.cat,
         XCH,
         0.0,
@@ -204,7 +221,7 @@ async def test_cat_create_offers(
 
 
 async def test_coin_selection_toomuch(
-    rpc, switch_fingerprint, wait_until_synced, wait_until_settled, test_wallet, db, dexie, hashgreen
+    rpc, switch_fingerprint, wait_until_synced, wait_until_settled, test_wallet, db, dexie, hashgreen, from_scratch
 ):
     await switch_fingerprint(test_wallet.fingerprint)
     await wait_until_settled(int(XCH_WALLET_ID))
@@ -214,7 +231,7 @@ async def test_coin_selection_toomuch(
     p_max = "2000" * test_wallet.cat / (1 * XCH)
     curve = LiquidityCurve.make_out_of_range(x_max, p_min, p_max)
     with pytest.raises(ValueError):
-        await Engine.from_scratch(
+        await from_scratch(
             XCH,
             test_wallet.cat,
             0.0,
@@ -227,7 +244,16 @@ async def test_coin_selection_toomuch(
 
 
 async def test_flip_offer(
-    test_wallet, rpc, switch_fingerprint, wait_until_synced, wait_until_settled, db, dexie, hashgreen, chia_simulator
+    test_wallet,
+    rpc,
+    switch_fingerprint,
+    wait_until_synced,
+    wait_until_settled,
+    db,
+    dexie,
+    hashgreen,
+    chia_simulator,
+    from_scratch,
 ):
     await switch_fingerprint(test_wallet.fingerprint)
     await wait_until_settled(int(XCH_WALLET_ID))
@@ -240,7 +266,7 @@ async def test_flip_offer(
     p_min = 60 * test_wallet.cat / (1 * XCH)
     p_max = 200 * test_wallet.cat / (1 * XCH)
     curve = LiquidityCurve.make_out_of_range(x_max, p_min, p_max)
-    tm = await Engine.from_scratch(
+    tm = await from_scratch(
         XCH,
         test_wallet.cat,
         0.0,
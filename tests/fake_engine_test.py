@@ -0,0 +1,423 @@
+"""
+Engine tests against the fake wallet of the benchmarks, for what the simulator cannot easily stage.
+"""
+import asyncio
+import dataclasses
+import math
+import time
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.wallet.trading.trade_status import TradeStatus
+
+from benchmarks.fakes import FakeWalletRpcClient, FakeWalletRpcClientService
+from chia_liquidity_provider import Engine, Grid, LiquidityCurve, dexie_api, engine, hashgreen_api, metrics
+from chia_liquidity_provider.types import Asset
+
+BASE, QUOTE = Asset.XCH, Asset.USDS
+RUNGS = 10
+
+
+@pytest.fixture
+def wallet():
+    return FakeWalletRpcClient()
+
+
+@pytest.fixture
+def rpc(wallet):
+    return FakeWalletRpcClientService(wallet)
+
+
+@pytest.fixture
+def services(db, rpc):
+    return [db, rpc]
+
+
+@pytest.fixture
+def dexie():
+    api = Mock(spec=dexie_api.Api)
+    api.post_offer = AsyncMock()
+    return api
+
+
+@pytest.fixture
+def hashgreen():
+    api = Mock(spec=hashgreen_api.Api)
+    api.post_offer = AsyncMock()
+    return api
+
+
+P_INIT = 100 * QUOTE / (1 * BASE)
+
+
+@pytest.fixture
+def grid():
+    x_max = 1000 * BASE
+    curve = LiquidityCurve.make_out_of_range(x_max, 20 * QUOTE / (1 * BASE), 200 * QUOTE / (1 * BASE))
+    return Grid.make(curve, x_max // RUNGS, x_max)
+
+
+@pytest.fixture
+async def e(wallet, rpc, db, dexie, hashgreen, grid):
+    """
+    An engine with half of its orders on each side, checked once.
+    """
+    e = await Engine.from_scratch(BASE, QUOTE, P_INIT, grid, rpc, db, dexie, hashgreen)
+    try:
+        wallet.new_block()
+        assert await e.check_open_trades() == []
+        yield e
+    finally:
+        await e.close()
+
+
+async def open_orders(e):
+    return await e.db.get_order(await e.db.get_position())
+
+
+def fail(monkeypatch, wallet, method, when):
+    """
+    Make a wallet rpc method raise on the calls for which `when(call number, *args)` holds.
+    """
+    wrapped = getattr(wallet, method)
+    calls = 0
+
+    async def failing(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        if when(calls, *args):
+            raise RuntimeError(f"{method} failed")
+        return await wrapped(*args, **kwargs)
+
+    monkeypatch.setattr(wallet, method, failing)
+
+
+def is_flipped(order, orders):
+    """
+    Tell whether `order` has been replaced with an order on the other side of its rung.
+    """
+    return order.trade_id not in {o.trade_id for o in orders} and any(
+        o.rung == order.rung and (o.base_delta < 0) != (order.base_delta < 0) for o in orders
+    )
+
+
+async def test_find_suspects(wallet, e):
+    orders = await open_orders(e)
+    assert len(orders) == RUNGS
+    taken, forgotten = orders[:2]
+    wallet.take(taken.trade_id)
+    # the wallet refuses to look up a batch with a coin it does not know, the others are still told apart
+    del wallet.coins[wallet.trades[forgotten.trade_id].coins_of_interest[0].name()]
+    assert await e._find_suspects(orders) == [taken, forgotten]
+
+    wallet.new_block()
+    get_offer_calls = wallet.calls.get("get_offer", 0)
+    assert await e.check_open_trades() == [taken]
+    assert wallet.calls["get_offer"] - get_offer_calls == 2
+
+
+async def test_coin_records_by_halves(wallet, e):
+    for _ in range(200):
+        wallet.mint(1, 1)
+    known = list(wallet.coins)
+    unknown = bytes32(bytes(32))
+    coin_ids = known[:100] + [unknown] + known[100:]
+    calls = wallet.calls["get_coin_records_by_names"]
+    assert set(await e._get_coin_records(coin_ids)) == set(known)
+    # the batch is bisected down to the unknown coin, instead of looking up every coin on its own
+    assert wallet.calls["get_coin_records_by_names"] - calls <= 1 + 2 * math.ceil(math.log2(len(coin_ids)))
+
+
+async def test_wait_for_sync(wallet, e):
+    taken = (await open_orders(e))[0]
+    wallet.take(taken.trade_id)
+    wallet.new_block()
+    wallet.synced = False
+    calls = wallet.calls.get("get_coin_records_by_names", 0)
+    # nothing is a suspect to a wallet that is catching up, nothing is looked up either
+    assert await e.check_open_trades() == []
+    assert wallet.calls.get("get_coin_records_by_names", 0) == calls
+    assert await e.get_checked_height() < wallet.height
+
+    wallet.synced = True
+    assert await e.check_open_trades() == [taken]
+
+
+async def test_split_addresses(wallet, e):
+    # the base and quote splits run at once, from separate ranges of derivation indexes
+    by_wallet = {}
+    for tx in wallet.transactions.values():
+        by_wallet.setdefault(tx.wallet_id, []).extend(addition["puzzle_hash"] for addition in tx.additions)
+    assert len(by_wallet) == 2
+    puzzle_hashes = [puzzle_hash for hashes in by_wallet.values() for puzzle_hash in hashes]
+    assert len(puzzle_hashes) == RUNGS
+    assert len(set(puzzle_hashes)) == len(puzzle_hashes)
+
+
+async def test_from_scratch_despite_failed_creation(wallet, rpc, db, dexie, hashgreen, grid, monkeypatch):
+    wallet.latency = 0.01  # so that creations overlap
+    fail(monkeypatch, wallet, "create_offer_for_ids", lambda call, *_: call == 2)
+    with pytest.raises(RuntimeError, match="create_offer_for_ids failed"):
+        await Engine.from_scratch(BASE, QUOTE, P_INIT, grid, rpc, db, dexie, hashgreen)
+    # the other creations settled first, and were recorded
+    trades = len(wallet.trades)
+    orders = await db.get_order(await db.get_position())
+    assert {order.trade_id for order in orders} == set(wallet.trades)
+    assert len(orders) == RUNGS - 1
+
+    # nothing happens once the engine is closed
+    await asyncio.sleep(0.1)
+    assert len(wallet.trades) == trades
+    assert len(await db.get_order(await db.get_position())) == len(orders)
+
+
+async def test_check_despite_failed_lookup(wallet, e, monkeypatch):
+    taken = (await open_orders(e))[:3]
+    for order in taken:
+        wallet.take(order.trade_id)
+    wallet.new_block()
+    fail(monkeypatch, wallet, "get_offer", lambda call, trade_id, *_: trade_id == taken[1].trade_id)
+    # the other orders are flipped and recorded all the same
+    assert await e.check_open_trades() == [taken[0], taken[2]]
+    orders = await open_orders(e)
+    assert [is_flipped(order, orders) for order in taken] == [True, False, True]
+    assert {fill.order.trade_id for fill in await e.db.get_fills()} == {taken[0].trade_id, taken[2].trade_id}
+
+    # the sweep was incomplete, the next one looks again without waiting for a block
+    monkeypatch.undo()
+    assert await e.check_open_trades() == [taken[1]]
+    orders = await open_orders(e)
+    assert all(is_flipped(order, orders) for order in taken)
+    assert len(orders) == RUNGS
+
+
+async def test_flip_despite_failed_creation(wallet, e, monkeypatch):
+    taken = (await open_orders(e))[:3]
+    for order in taken:
+        wallet.take(order.trade_id)
+    wallet.new_block()
+    fail(monkeypatch, wallet, "create_offer_for_ids", lambda call, *_: call == 2)
+    with pytest.raises(RuntimeError, match="create_offer_for_ids failed"):
+        await e.check_open_trades()
+    # the flips that went through are recorded and published
+    orders = await open_orders(e)
+    assert sorted(is_flipped(order, orders) for order in taken) == [False, True, True]
+    assert len(await e.db.get_fills()) == 2
+    await e.wait_published()
+    assert e.dexie.post_offer.await_count == RUNGS + 2
+
+    # the last one is flipped by the next sweep
+    monkeypatch.undo()
+    [retried] = await e.check_open_trades()
+    assert not is_flipped(retried, orders)
+    orders = await open_orders(e)
+    assert all(is_flipped(order, orders) for order in taken)
+    assert len(orders) == RUNGS
+
+
+@pytest.mark.parametrize("method", ["check_open_trades", "sync_open_trades"])
+async def test_check_and_sync_agree(wallet, e, method, monkeypatch):
+    monkeypatch.setattr(engine, "OFFERS_PAGE_SIZE", 2)  # several pages
+    before = await open_orders(e)
+    taken = before[1:8:3]
+    for order in taken:
+        wallet.take(order.trade_id)
+    wallet.new_block()
+    assert sorted(await getattr(e, method)(), key=before.index) == taken
+    orders = await open_orders(e)
+    assert [is_flipped(order, orders) for order in before] == [order in taken for order in before]
+    # nothing new to either of them
+    wallet.new_block()
+    assert await e.check_open_trades() == []
+    assert await e.sync_open_trades() == []
+
+
+async def advance(wallet, e, blocks):
+    """
+    Farm `blocks` blocks, checking the open orders after each one, and return the orders flipped along the way.
+    """
+    flipped = []
+    for _ in range(blocks):
+        wallet.new_block()
+        flipped.extend(await e.check_open_trades())
+    return flipped
+
+
+async def take_and_flip(wallet, e):
+    """
+    Take an order in a new block and flip it, return it with the height of that block.
+    """
+    order = (await open_orders(e))[0]
+    wallet.new_block()
+    wallet.take(order.trade_id)
+    assert await e.check_open_trades() == [order]
+    return order, wallet.height
+
+
+async def roll_back(wallet, e, height):
+    """
+    Undo the blocks from `height` on, and farm until the engine notices.
+    """
+    wallet.rollback(height - 1)
+    # the wallet is back where it was at the last check after one block, there is something new after two
+    assert await advance(wallet, e, 2) == []
+
+
+async def test_undo_rolled_back_fill(wallet, e):
+    order, height = await take_and_flip(wallet, e)
+    [fill] = await e.db.get_fills()
+    assert (fill.order, fill.height) == (order, height)
+
+    await roll_back(wallet, e, height)
+    assert await advance(wallet, e, engine.ROLLBACK_GRACE - 1) == []
+    # still within the grace period, the fill could be confirmed again
+    assert await e.db.get_fills() == [dataclasses.replace(fill, rolled_back_height=height + 1)]
+    assert fill.replacement_id in {o.trade_id for o in await open_orders(e)}
+
+    assert await advance(wallet, e, 1) == []
+    # the coin the replacement spends is gone, its secure cancellation has nothing to spend yet
+    assert wallet.trades[fill.replacement_id].status == TradeStatus.PENDING_CANCEL.value
+    orders = await open_orders(e)
+    assert order in orders and fill.replacement_id not in {o.trade_id for o in orders}
+    assert len(orders) == RUNGS
+    assert await e.db.get_fills() == [dataclasses.replace(fill, rolled_back_height=height + 1, undone=True)]
+    assert await advance(wallet, e, engine.REORG_DEPTH) == []
+    assert [fill.undone for fill in await e.db.get_fills()] == [True]
+
+
+async def test_fill_confirmed_after_undo(wallet, e):
+    order, height = await take_and_flip(wallet, e)
+    [fill] = await e.db.get_fills()
+    await roll_back(wallet, e, height)
+    await advance(wallet, e, engine.ROLLBACK_GRACE)
+    replacement = wallet.trades[fill.replacement_id]
+    assert replacement.status == TradeStatus.PENDING_CANCEL.value
+
+    # the taker's spend makes it into a block after all, bringing back the coin the replacement spends
+    wallet.new_block()
+    wallet.take(order.trade_id)
+    # the cancellation spends that coin in the next block, the order cannot be flipped with it until then
+    with pytest.raises(ValueError, match="Can't select amount"):
+        await advance(wallet, e, 1)
+    assert await advance(wallet, e, 1) == [order]
+    # the replacement is cancelled for good, and the order flipped anew
+    [coin] = replacement.coins_of_interest
+    assert wallet.coins[coin.name()].spent
+    assert replacement.status == TradeStatus.CANCELLED.value
+    orders = await open_orders(e)
+    assert is_flipped(order, orders) and fill.replacement_id not in {o.trade_id for o in orders}
+    assert len(orders) == RUNGS
+    [again] = await e.db.get_fills()
+    assert again.order == order and again.replacement_id != fill.replacement_id and not again.undone
+
+
+async def test_fill_confirmed_again(wallet, e):
+    order, height = await take_and_flip(wallet, e)
+    [fill] = await e.db.get_fills()
+    await roll_back(wallet, e, height)
+
+    # the taker's spend makes it into another block
+    wallet.new_block()
+    wallet.take(order.trade_id)
+    again = wallet.height
+    assert await advance(wallet, e, engine.ROLLBACK_GRACE) == []
+    assert await e.db.get_fills() == [dataclasses.replace(fill, height=again)]
+    assert wallet.trades[fill.replacement_id].status == TradeStatus.PENDING_ACCEPT.value
+    assert fill.replacement_id in {o.trade_id for o in await open_orders(e)}
+
+
+async def test_keep_settled_fill(wallet, e):
+    order, height = await take_and_flip(wallet, e)
+    [fill] = await e.db.get_fills()
+    await advance(wallet, e, engine.REORG_DEPTH)
+    assert await e.db.get_fills() == []
+
+    # deeper than any reorg we follow, the replacement stands
+    await roll_back(wallet, e, height)
+    assert await advance(wallet, e, engine.ROLLBACK_GRACE) == []
+    assert wallet.trades[fill.replacement_id].status == TradeStatus.PENDING_ACCEPT.value
+    orders = await open_orders(e)
+    assert order not in orders and fill.replacement_id in {o.trade_id for o in orders}
+
+
+async def test_undo_before_publication(wallet, e):
+    await e.wait_published()
+    for venue in e.venues.values():
+        venue.post_offer.side_effect = RuntimeError("down")
+    order, height = await take_and_flip(wallet, e)
+    [fill] = await e.db.get_fills()
+    queued = await e.db.get_due_publications(now=time.time() + 3600, limit=100)
+    assert {p.trade_id for p in queued} == {fill.replacement_id}
+
+    await roll_back(wallet, e, height)
+    await advance(wallet, e, engine.ROLLBACK_GRACE)
+    # the replacement is dropped from the queue before it could be published, the order is queued again
+    queued = await e.db.get_due_publications(now=time.time() + 3600, limit=100)
+    assert {p.trade_id for p in queued} == {order.trade_id}
+    assert wallet.trades[fill.replacement_id].status == TradeStatus.PENDING_CANCEL.value
+
+
+async def test_catch_up_chain(wallet, e):
+    position = await e.db.get_position()
+    order = (await open_orders(e))[0]
+    wallet.new_block()
+    wallet.take(order.trade_id)
+    # a run that stopped before recording its flips: the first was taken in turn, the second is still open
+    wallet.new_block()
+    flip, _ = await e._create_trade(position, order.rung, -order.base_delta)
+    wallet.take(flip.trade_id)
+    wallet.new_block()
+    flop, _ = await e._create_trade(position, flip.rung, -flip.base_delta)
+    wallet.new_block()
+
+    created = wallet.calls["create_offer_for_ids"]
+    assert await e.catch_up() == [order]
+    assert wallet.calls["create_offer_for_ids"] == created
+    orders = await open_orders(e)
+    assert flop in orders and order not in orders and flip not in orders
+    assert len(orders) == RUNGS
+    assert [fill.order for fill in await e.db.get_fills()] == [order]
+    await e.wait_published()
+    assert e.dexie.post_offer.await_count == RUNGS + 1
+
+
+async def test_catch_up_leaves_other_offers(wallet, e):
+    position = await e.db.get_position()
+    order = (await open_orders(e))[0]
+    wallet.new_block()
+    wallet.take(order.trade_id)
+    wallet.new_block()
+    deltas = position.grid.flip(order.base_delta, order.quote_delta, order.rung)
+    offer_dict = dict(zip((position.base_asset_wallet_id, position.quote_asset_wallet_id), deltas))
+    [(wallet_id, amount)] = [(w, -d) for w, d in offer_dict.items() if d < 0]
+    [paid] = [a for w, a in wallet.trades[order.trade_id].payments if w == wallet_id]
+    # the same amounts, offered by hand with another coin
+    wallet.mint(wallet_id, amount + 1)
+    _, manual = await wallet.create_offer_for_ids(offer_dict, min_coin_amount=amount + 1, max_coin_amount=amount + 1)
+    # and by another position of the same wallet, with the coin the fill paid
+    _, other = await wallet.create_offer_for_ids(offer_dict, min_coin_amount=paid, max_coin_amount=paid)
+    wallet.new_block()
+
+    wallet.mint(wallet_id, paid)  # for the replacement
+    assert await e.catch_up(excluded={other.trade_id}) == [order]
+    orders = await open_orders(e)
+    assert not {manual.trade_id, other.trade_id} & {o.trade_id for o in orders}
+    assert any((o.base_delta, o.quote_delta) == deltas for o in orders)
+    assert len(orders) == RUNGS
+    assert wallet.trades[manual.trade_id].status == wallet.trades[other.trade_id].status == 0
+
+
+async def test_requote_seconds(wallet, e):
+    await e.wait_published()
+    e.hashgreen.post_offer.side_effect = RuntimeError("down")
+    before = metrics.REQUOTE_SECONDS.count(position=e.db.position_id)
+    taken = (await open_orders(e))[:3]
+    for order in taken:
+        wallet.take(order.trade_id)
+    wallet.new_block()
+    assert len(await e.check_open_trades()) == 3
+    # once each flip is out, on whichever venue took it
+    await e.wait_published()
+    assert metrics.REQUOTE_SECONDS.count(position=e.db.position_id) == before + 3
+    assert e._requotes == {}
@@ -1,6 +1,7 @@
 import math
+from fractions import Fraction
 
-from chia_liquidity_provider import LiquidityCurve
+from chia_liquidity_provider import FixedPointLiquidityCurve, LiquidityCurve
 
 
 def test_make_out_of_range():
@@ -14,3 +15,49 @@ def test_make_out_of_range():
     assert curve.f(x_max) == 0
     y_max = math.sqrt(p_min * p_max) * x_max
     assert curve.f(0) == y_max
+
+
+def test_f_batch():
+    curve = LiquidityCurve.make_out_of_range(3, 1, 3)
+    xs = [0, 0.5, 1, 2.25, 3]
+    assert curve.f_batch(xs) == [curve.f(x) for x in xs]
+
+
+def test_fixed_point_make_out_of_range():
+    x_max = 3
+    p_min = 1
+    p_max = 3
+    curve = FixedPointLiquidityCurve.make_out_of_range(x_max, p_min, p_max)
+    assert curve.L > 0
+    assert curve.f(x_max) == 0
+    y_max = math.sqrt(p_min * p_max) * x_max
+    assert curve.f(0) == math.floor(y_max)
+
+
+def test_fixed_point_deltas():
+    x_max = 10**12
+    p_min = 60_000 / x_max
+    p_max = 200_000 / x_max
+    xs = range(0, x_max + 2 * 10**11, 10**11)
+    deltas = FixedPointLiquidityCurve.make_out_of_range(x_max, p_min, p_max).deltas(xs)
+    assert deltas == [18474, 15855, 13757, 12049, 10640, 9465, 8475, 7632, 6909, 6284, 5740]
+    # no drift against the float curve beyond truncation
+    float_deltas = LiquidityCurve.make_out_of_range(x_max, p_min, p_max).deltas(xs)
+    assert all(abs(a - b) < 1 for a, b in zip(deltas, float_deltas))
+
+
+def test_fixed_point_quote_deltas():
+    x_max = 10**12
+    p_min = Fraction(60_000, x_max)
+    p_max = Fraction(200_000, x_max)
+    xs = range(0, x_max + 2 * 10**11, 10**11)
+    curve = FixedPointLiquidityCurve.make_out_of_range(x_max, p_min, p_max)
+    bids, asks = curve.quote_deltas(xs)
+    assert bids == curve.deltas(xs)
+    # the same curve, evaluated exactly
+    S = 1 << curve.PRECISION
+    f = lambda x: curve.L**2 / (x + curve.L * S / curve.sqrt_p_max) - curve.L * Fraction(curve.sqrt_p_min, S)
+    for x0, x1, bid, ask in zip(xs, xs[1:], bids, asks):
+        # the LP pays no more than the curve for base, and asks no less for it
+        assert bid == math.floor(f(x0) - f(x1))
+        assert ask == math.ceil(f(x0) - f(x1))
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+
+# modules that only the online commands need
+HEAVY_MODULES = [
+    "aiohttp",
+    "aiomisc",
+    "aiosqlite",
+    "chia.consensus",
+    "chia.rpc",
+    "chia.util.keychain",
+    "chia.wallet",
+    "chia_liquidity_provider.engine",
+    "chia_liquidity_provider.services",
+]
+
+
+def test_cli_imports_lazily():
+    # in a fresh interpreter, since the test session has imported everything already
+    code = "import sys, chia_liquidity_provider.main; print('\\n'.join(sys.modules))"
+    modules = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout.split()
+    loaded = [m for m in modules if any(m == h or m.startswith(h + ".") for h in HEAVY_MODULES)]
+    assert loaded == []
+
+
+def test_lazy_exports():
+    import chia_liquidity_provider
+    import chia_liquidity_provider.types
+
+    assert chia_liquidity_provider.Grid is chia_liquidity_provider.types.Grid
+    assert set(chia_liquidity_provider.__all__) == {
+        "abc",
+        "Engine",
+        "FixedPointLiquidityCurve",
+        "Grid",
+        "LiquidityCurve",
+    }
@@ -0,0 +1,74 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+from chia_liquidity_provider import profiling
+
+
+def busy(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_stage_without_profiler():
+    with profiling.stage("anything"):
+        pass
+
+
+def test_profiler(tmpdir):
+    profiler = profiling.Profiler(Path(tmpdir), "test", sampling_interval=0.001)
+    with profiling.enabled(profiler):
+        with profiling.stage("outer"):
+            with profiling.stage("inner"):
+                busy(0.02)
+        tick = profiler.lap()
+        with profiling.stage("inner"):
+            pass
+    assert tick.count == {"outer": 1, "inner": 1}
+    assert tick.total["outer"] >= tick.total["inner"] >= 0.02
+    assert profiler.overall.count == {"outer": 1, "inner": 2}
+
+    (prof,) = Path(tmpdir).glob("test-*.prof")
+    folded = prof.with_suffix(".folded").read_text()
+    assert "busy" in folded
+    assert set(json.loads(prof.with_suffix(".json").read_text())) == {"outer", "inner"}
+
+
+def test_write_at_lap(tmpdir):
+    profiler = profiling.Profiler(Path(tmpdir), "test", sampling_interval=0.001)
+    with profiling.enabled(profiler):
+        with profiling.stage("outer"):
+            busy(0.02)
+        profiler.lap()
+        # written before the process is stopped, by whatever means
+        (prof,) = Path(tmpdir).glob("test-*.prof")
+        assert "busy" in prof.with_suffix(".folded").read_text()
+        assert set(json.loads(prof.with_suffix(".json").read_text())) == {"outer"}
+
+
+def test_segments(tmpdir):
+    profiler = profiling.Profiler(Path(tmpdir), "test", sampling_interval=0.001, segment_duration=0)
+    with profiling.enabled(profiler):
+        busy(0.02)
+        profiler.lap()  # writes out the first segment, which is over already
+        # the profile and stacks start over with each segment
+        second = profiler.write()
+        assert "busy" not in second.with_suffix(".folded").read_text()
+
+
+def test_max_stacks():
+    sampler = profiling.StackSampler(threading.get_ident(), max_stacks=1)
+
+    def sample_here():
+        sampler.sample()
+
+    def sample_there():
+        sampler.sample()
+
+    sample_here()
+    sample_there()
+    sample_here()
+    assert sorted(sampler.stacks.values()) == [1, 2]
+    assert sampler.stacks[sampler.TRUNCATED] == 1
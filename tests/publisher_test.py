@@ -0,0 +1,136 @@
+import asyncio
+import functools
+import time
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from chia.types.blockchain_format.sized_bytes import bytes32
+
+from chia_liquidity_provider import Engine, dexie_api, engine, hashgreen_api
+from chia_liquidity_provider.types import Publication
+
+TRADE_ID = bytes32(b"\x01" * 32)
+
+
+@pytest.fixture
+def services(db):
+    return [db]
+
+
+@pytest.fixture(autouse=True)
+def short_delays(monkeypatch):
+    monkeypatch.setattr(engine, "MIN_PUBLICATION_RETRY_DELAY", 0.2)
+    monkeypatch.setattr(engine, "MAX_PUBLICATION_RETRY_DELAY", 0.4)
+    monkeypatch.setattr(engine, "MIN_PUBLISHER_ERROR_DELAY", 0.1)
+
+
+@pytest.fixture
+def dexie():
+    api = Mock(spec=dexie_api.Api)
+    api.post_offer = AsyncMock()
+    return api
+
+
+@pytest.fixture
+def hashgreen():
+    api = Mock(spec=hashgreen_api.Api)
+    api.post_offer = AsyncMock()
+    return api
+
+
+async def queue(db, *venues):
+    async with db.transaction():
+        await db.insert_publications(Publication(TRADE_ID, venue, "offer1") for venue in venues)
+
+
+async def wait_for_calls(api, count):
+    while api.post_offer.await_count < count:
+        await asyncio.sleep(0.01)
+
+
+async def queued(db):
+    return await db.get_due_publications(now=time.time() + 3600, limit=10)
+
+
+async def test_retry_with_backoff(db, dexie, hashgreen):
+    dexie.post_offer.side_effect = [RuntimeError("down"), RuntimeError("down"), None]
+    await queue(db, "dexie", "hashgreen")
+    e = Engine(None, db, dexie, hashgreen)
+    start = time.time()
+    e.start()
+    try:
+        await asyncio.wait_for(e.wait_published(), 5)
+        # hashgreen took it, dexie is retried later
+        [publication] = await queued(db)
+        assert (publication.venue, publication.attempts) == ("dexie", 1)
+        assert publication.next_attempt >= start + 0.2
+
+        await asyncio.wait_for(wait_for_calls(dexie, 2), 5)
+        [publication] = await queued(db)
+        assert publication.attempts == 2
+        # the delay doubles, up to the maximum
+        assert publication.next_attempt >= start + 0.2 + 0.4
+
+        await asyncio.wait_for(wait_for_calls(dexie, 3), 5)
+        while await queued(db):
+            await asyncio.sleep(0.01)
+    finally:
+        await e.close()
+    dexie.post_offer.assert_awaited_with("offer1")
+    hashgreen.post_offer.assert_awaited_once_with("offer1")
+
+
+async def test_resume_after_restart(db, dexie, hashgreen):
+    dexie.post_offer.side_effect = RuntimeError("down")
+    await queue(db, "dexie")
+    e = Engine(None, db, dexie, hashgreen)
+    e.start()
+    await asyncio.wait_for(e.wait_published(), 5)
+    await e.close()
+    assert len(await queued(db)) == 1
+
+    # the queue is in the database, a new engine picks it up once the retry is due
+    dexie.post_offer.side_effect = None
+    e = Engine(None, db, dexie, hashgreen)
+    e.start()
+    try:
+        await asyncio.wait_for(wait_for_calls(dexie, 2), 5)
+        while await queued(db):
+            await asyncio.sleep(0.01)
+    finally:
+        await e.close()
+
+
+async def test_survive_database_errors(db, dexie, hashgreen, monkeypatch):
+    get_due_publications = db.get_due_publications
+    monkeypatch.setattr(db, "get_due_publications", AsyncMock(side_effect=RuntimeError("database is locked")))
+    e = Engine(None, db, dexie, hashgreen)
+    e.start()
+    try:
+        await queue(db, "dexie")
+        while db.get_due_publications.await_count < 2:  # retried after the delay
+            await asyncio.sleep(0.01)
+        assert not e._publisher.done()
+
+        monkeypatch.setattr(db, "get_due_publications", get_due_publications)
+        await asyncio.wait_for(wait_for_calls(dexie, 1), 5)
+        await asyncio.wait_for(e.wait_published(), 5)
+    finally:
+        await e.close()
+
+
+async def test_cancel_bounded_gather():
+    started = []
+
+    async def post(i):
+        started.append(i)
+        await asyncio.sleep(10)
+
+    task = asyncio.create_task(engine.gather_bounded(1, (functools.partial(post, i) for i in range(3))))
+    while not started:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    # the waiting ones were never started, so there is nothing left unawaited
+    assert started == [0]
@@ -1,9 +1,10 @@
+import dataclasses
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 import pytest
 from chia.types.blockchain_format.sized_bytes import bytes32
-from chia.util.ints import uint32
+from chia.util.ints import uint32, uint64
 
 from chia_liquidity_provider import LiquidityCurve
 from chia_liquidity_provider.types import *
@@ -25,3 +26,129 @@ async def test_init_position(db):
     await db.init_position(position)
     row = await db.get_position()
     assert row == position
+
+
+async def test_position_cache(db):
+    grid = Grid(uint64(10), [uint64(30), uint64(20), uint64(10)])
+    with pytest.raises(RuntimeError):
+        async with db.transaction():
+            await db.init_position(Position(123456789, uint32(1), uint32(2), grid))
+            assert (await db.get_position()).fingerprint == 123456789
+            raise RuntimeError("rollback")
+    with pytest.raises(RuntimeError):
+        await db.get_position()
+
+    async with db.transaction():
+        await db.init_position(Position(987654321, uint32(1), uint32(2), grid))
+    position = await db.get_position()
+    assert position.fingerprint == 987654321
+    assert await db.get_position() is position
+
+
+async def test_publication_queue(db):
+    trade_id = bytes32(b"\x01" * 32)
+    publication = Publication(trade_id, "dexie", "offer1")
+    async with db.transaction():
+        await db.insert_publication(publication)
+        await db.insert_publication(publication)  # deduplicated
+        await db.insert_publication(Publication(trade_id, "hashgreen", "offer1"))
+    assert await db.count_unattempted_publications() == 2
+    assert len(await db.get_due_publications(now=0, limit=10)) == 2
+
+    async with db.transaction():
+        await db.reschedule_publication(publication, next_attempt=100)
+    assert await db.count_unattempted_publications() == 1
+    assert [p.venue for p in await db.get_due_publications(now=99, limit=10)] == ["hashgreen"]
+    _, retry = await db.get_due_publications(now=100, limit=10)
+    assert retry == Publication(trade_id, "dexie", "offer1", attempts=1, next_attempt=100)
+
+    async with db.transaction():
+        await db.delete_publications([trade_id])
+    assert await db.get_next_publication_time() is None
+
+
+async def test_bulk_orders(db):
+    grid = Grid(uint64(10), [uint64(30), uint64(20), uint64(10)])
+    position = Position(123456789, uint32(1), uint32(2), grid)
+    orders = [Order(bytes32(bytes([i]) * 32), -10, 10 * i, i) for i in range(1, 4)]
+    async with db.transaction():
+        await db.init_position(position)
+        await db.insert_orders(position, orders)
+    assert await db.get_order(position) == orders
+
+    async with db.transaction():
+        await db.delete_orders(orders[:2])
+    assert await db.get_order(position) == orders[2:]
+
+
+async def test_migrations(db):
+    from chia_liquidity_provider.services.database import MIGRATIONS
+
+    async with db.conn.execute("PRAGMA user_version") as cursor:
+        assert (await cursor.fetchone())[0] == len(MIGRATIONS)
+    async with db.conn.execute("PRAGMA journal_mode") as cursor:
+        assert (await cursor.fetchone())[0] == "wal"
+    # migrations are idempotent on an up to date schema
+    async with db.transaction():
+        for migration in MIGRATIONS:
+            await migration(db.conn)
+
+
+async def test_trade_snapshots(db):
+    trade_id = bytes32(b"\x01" * 32)
+    coin_ids = (bytes32(b"\x02" * 32), bytes32(b"\x03" * 32))
+    async with db.transaction():
+        await db.insert_trade_snapshots([TradeSnapshot(trade_id, 0, coin_ids)])
+        await db.set_checkpoint("open_trades", 100)
+    assert await db.get_trade_snapshots() == {trade_id: TradeSnapshot(trade_id, 0, coin_ids)}
+    assert await db.get_checkpoint("open_trades") == 100
+    assert await db.get_checkpoint("other") is None
+
+    async with db.transaction():
+        await db.insert_trade_snapshots([TradeSnapshot(trade_id, 4, coin_ids)])
+        await db.set_checkpoint("open_trades", 101)
+    assert (await db.get_trade_snapshots())[trade_id].final
+    assert await db.get_checkpoint("open_trades") == 101
+
+    async with db.transaction():
+        await db.delete_trade_snapshots([trade_id])
+    assert await db.get_trade_snapshots() == {}
+
+
+async def test_encode_publications(db):
+    from blspy import G2Element
+    from chia.types.spend_bundle import SpendBundle
+    from chia.wallet.trading.offer import Offer
+
+    from chia_liquidity_provider.services.database import _encode_publications
+
+    offer = Offer({}, SpendBundle([], G2Element()), {})
+    trade_id = bytes32(b"\x01" * 32)
+    async with db.transaction():
+        # as stored before publications held the bech32 encoding
+        await db.conn.execute(
+            f"INSERT INTO {Publication.TABLE_NAME} VALUES(?, ?, ?, ?, ?)", (trade_id, "dexie", bytes(offer), 0, 0)
+        )
+        await db.insert_publication(Publication(trade_id, "hashgreen", offer.to_bech32()))
+        await _encode_publications(db.conn)
+    assert [p.offer for p in await db.get_due_publications(now=0, limit=10)] == [offer.to_bech32()] * 2
+
+
+async def test_fills(db):
+    order = Order(bytes32(b"\x01" * 32), -10, 40, 1)
+    coin_ids = (bytes32(b"\x02" * 32),)
+    settled = Fill(order, bytes32(b"\x03" * 32), coin_ids, 100)
+    recent = Fill(dataclasses.replace(order, trade_id=bytes32(b"\x04" * 32)), bytes32(b"\x05" * 32), coin_ids, 110)
+    rolled_back = dataclasses.replace(settled, order=dataclasses.replace(order, trade_id=bytes32(b"\x06" * 32)))
+    rolled_back = dataclasses.replace(rolled_back, height=90, rolled_back_height=120)
+    async with db.transaction():
+        await db.insert_fills([settled, recent, rolled_back])
+    assert await db.get_fills() == [recent, settled, rolled_back]
+
+    async with db.transaction():
+        await db.delete_settled_fills(105)
+    assert await db.get_fills() == [recent, rolled_back]
+
+    async with db.transaction():
+        await db.delete_fills([recent.order.trade_id, rolled_back.order.trade_id])
+    assert await db.get_fills() == []
@@ -0,0 +1,46 @@
+import aiohttp
+import pytest
+
+from chia_liquidity_provider.metrics import Counter, Histogram, Registry
+from chia_liquidity_provider.services import MetricsService
+
+registry = Registry()
+requests = Counter("test_requests_total", "Requests handled.", ["venue"], registry=registry)
+latency = Histogram("test_latency_seconds", "Request latency.", buckets=[0.1, 1], registry=registry)
+
+
+@pytest.fixture
+def metrics(aiomisc_unused_port):
+    return MetricsService(registry, port=aiomisc_unused_port)
+
+
+@pytest.fixture
+def services(metrics):
+    return [metrics]
+
+
+async def test_scrape(aiomisc_unused_port):
+    requests.inc(venue="dexie")
+    requests.inc(2, venue="hashgreen")
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+    with pytest.raises(ValueError):
+        requests.inc()  # missing label
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://localhost:{aiomisc_unused_port}/metrics") as rep:
+            assert rep.ok
+            assert rep.content_type == "text/plain"
+            text = await rep.text()
+
+    lines = text.splitlines()
+    assert "# TYPE test_requests_total counter" in lines
+    assert 'test_requests_total{venue="dexie"} 1.0' in lines
+    assert 'test_requests_total{venue="hashgreen"} 2.0' in lines
+    assert "# TYPE test_latency_seconds histogram" in lines
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{le="1.0"} 2' in lines
+    assert 'test_latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "test_latency_seconds_sum 5.55" in lines
+    assert "test_latency_seconds_count 3" in lines
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiomisc.service.aiohttp import AIOHTTPService
+
+from chia_liquidity_provider.services import WalletEventsService
+
+
+class FakeDaemon(AIOHTTPService):
+    """
+    Stand-in for the chia daemon that relays wallet events to registered websockets
+    """
+
+    async def create_application(self) -> web.Application:
+        self.websockets: list[web.WebSocketResponse] = []
+        self.registered = asyncio.Event()
+        app = web.Application()
+        app.router.add_get("/", self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        msg = await ws.receive_json()
+        assert msg["command"] == "register_service"
+        assert msg["data"] == {"service": "wallet_ui"}
+        self.websockets.append(ws)
+        self.registered.set()
+        async for _ in ws:
+            pass
+        return ws
+
+    async def state_changed(self, state: str) -> None:
+        for ws in self.websockets:
+            await ws.send_json({"command": "state_changed", "data": {"state": state}, "origin": "chia_wallet"})
+
+
+@pytest.fixture
+def daemon(aiomisc_unused_port):
+    return FakeDaemon(port=aiomisc_unused_port)
+
+
+@pytest.fixture
+def events(aiomisc_unused_port):
+    return WalletEventsService(f"ws://localhost:{aiomisc_unused_port}/", reconnect_delay=0.1)
+
+
+@pytest.fixture
+def services(daemon, events):
+    return [daemon, events]
+
+
+async def test_wakeup_on_state_change(daemon, events):
+    await daemon.registered.wait()
+    # the first connection always triggers a check
+    assert await events.wait_for_change(1)
+    assert events.connected
+    assert not await events.wait_for_change(0.1)
+
+    await daemon.state_changed("new_block")
+    assert await events.wait_for_change(1)
+    assert not await events.wait_for_change(0.1)
+
+
+async def test_ignore_irrelevant_state_change(daemon, events):
+    await daemon.registered.wait()
+    assert await events.wait_for_change(1)
+
+    await daemon.state_changed("sync_changed")
+    assert not await events.wait_for_change(0.1)
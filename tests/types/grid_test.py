@@ -0,0 +1,71 @@
+from fractions import Fraction
+
+import pytest
+from chia.util.ints import uint64
+
+from chia_liquidity_provider import FixedPointLiquidityCurve
+from chia_liquidity_provider.types import Grid
+
+GRID = Grid(uint64(10), [uint64(40), uint64(30), uint64(20), uint64(10)])
+
+
+def test_initial_orders():
+    assert list(GRID.initial_rungs(2.5)) == [(1, -10), (2, 10), (3, 10)]
+    assert list(GRID.initial_orders(2.5)) == [(-10, 40), (10, -20), (10, -10)]
+
+
+def test_flip():
+    for rung in range(1, 4):
+        for base_amount in (-10, 10):
+            base_delta, quote_delta = GRID.order(rung, base_amount)
+            assert GRID.rung(base_delta, quote_delta) == rung
+            assert GRID.flip(base_delta, quote_delta) == GRID.order(rung, -base_amount)
+            assert GRID.flip(*GRID.flip(base_delta, quote_delta)) == (base_delta, quote_delta)
+
+
+def test_flip_out_of_grid():
+    with pytest.raises(ValueError):
+        GRID.flip(10, -40)
+    with pytest.raises(ValueError):
+        GRID.flip(-10, 10)
+    with pytest.raises(ValueError):
+        GRID.flip(20, -30)
+
+
+def test_flip_duplicate_amounts():
+    grid = Grid(uint64(10), [uint64(40), uint64(30), uint64(30), uint64(10)])
+    assert grid.flip(10, -30, rung=1) == (-10, 40)
+    assert grid.flip(10, -30, rung=2) == (-10, 30)
+    assert grid.flip(-10, 30, rung=2) == (10, -30)
+    assert grid.flip(-10, 30, rung=3) == (10, -10)
+
+
+def test_coin_amounts():
+    # selling base spends one base coin, buying it back spends the quote coin of the split or of the sale
+    assert GRID.coin_amounts(1, -10) == (10, 10)
+    assert GRID.coin_amounts(1, 10) == (30, 40)
+    assert GRID.coin_amounts(3, 10) == (10, 40)
+
+
+def test_sell_quote_amounts():
+    # selling base at a rung brings in at least what buying it back costs at the rung below
+    grid = Grid(uint64(10), [uint64(40), uint64(30), uint64(20)], [uint64(41), uint64(31), uint64(21)])
+    assert grid.order(1, -10) == (-10, 41)
+    assert grid.order(1, 10) == (10, -30)
+    assert grid.flip(-10, 41) == (10, -30)
+    assert grid.flip(10, -30) == (-10, 41)
+    assert grid.coin_amounts(2, 10) == (20, 41)
+    assert Grid.from_json_dict(grid.to_json_dict()) == grid
+    assert "sell_quote_amounts" not in GRID.to_json_dict()
+
+
+def test_make_rounds_for_the_lp():
+    x_max = 10**12
+    curve = FixedPointLiquidityCurve.make_out_of_range(x_max, Fraction(60_000, x_max), Fraction(200_000, x_max))
+    grid = Grid.make(curve, x_max // 10, x_max)
+    bids, asks = curve.quote_deltas(range(0, x_max + 2 * 10**11, 10**11))
+    assert grid.quote_amounts == bids
+    assert grid.sell_quote_amounts == asks
+    for rung in range(1, len(grid.quote_amounts)):
+        assert grid.order(rung, -grid.base_amount)[1] == asks[rung - 1]
+        assert grid.order(rung, grid.base_amount)[1] == -bids[rung]